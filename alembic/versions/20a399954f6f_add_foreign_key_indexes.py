@@ -0,0 +1,66 @@
+"""add indexes on the foreign keys used as filters
+
+Revision ID: 20a399954f6f
+Revises: f82236e87b4b
+Create Date: 2026-10-18 10:12:41.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20a399954f6f'
+down_revision = 'f82236e87b4b'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns)
+# employee.email is not in here because its unique constraint
+# already comes with an index.
+INDEXES = [
+    (
+        'ix_task_log_initiative_id',
+        'task_log',
+        ['initiative_id']
+    ),
+    (
+        'ix_rating_initiative_id',
+        'rating',
+        ['initiative_id']
+    ),
+    (
+        'ix_review_initiative_id',
+        'review',
+        ['initiative_id']
+    ),
+    (
+        'ix_subscription_subscribed_by_initiative_id',
+        'subscription',
+        ['subscribed_by', 'initiative_id']
+    ),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY does not lock the table against writes,
+    # but it can not run inside a transaction block.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                postgresql_concurrently=True
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True
+            )
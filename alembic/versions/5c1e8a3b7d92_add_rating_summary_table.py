@@ -0,0 +1,71 @@
+"""add rating_summary table
+
+Revision ID: 5c1e8a3b7d92
+Revises: 20a399954f6f
+Create Date: 2026-10-18 17:41:06.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e8a3b7d92'
+down_revision = '20a399954f6f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'rating_summary',
+        sa.Column('initiative_id', sa.Integer(), nullable=False),
+        sa.Column(
+            'rating_count',
+            sa.Integer(),
+            server_default=sa.text('0'),
+            nullable=False
+        ),
+        sa.Column(
+            'point_sum',
+            sa.BigInteger(),
+            server_default=sa.text('0'),
+            nullable=False
+        ),
+        sa.Column('point_min', sa.Integer(), nullable=True),
+        sa.Column('point_max', sa.Integer(), nullable=True),
+        sa.Column(
+            'histogram',
+            postgresql.JSONB(astext_type=sa.Text()),
+            server_default=sa.text("'{}'::jsonb"),
+            nullable=False
+        ),
+        sa.ForeignKeyConstraint(
+            ['initiative_id'],
+            ['initiative.initiative_id'],
+            ondelete='CASCADE'
+        ),
+        sa.PrimaryKeyConstraint('initiative_id')
+    )
+
+    # Summaries for the ratings that are already there
+    op.execute("""
+        INSERT INTO rating_summary (
+            initiative_id, rating_count, point_sum,
+            point_min, point_max, histogram
+        )
+        SELECT
+            initiative_id, sum(n), sum(point * n),
+            min(point), max(point), jsonb_object_agg(point, n)
+        FROM (
+            SELECT initiative_id, point, count(*) AS n
+            FROM rating
+            GROUP BY initiative_id, point
+        ) AS points
+        GROUP BY initiative_id
+    """)
+
+
+def downgrade():
+    op.drop_table('rating_summary')
@@ -0,0 +1,52 @@
+"""add permissions_version to employee
+
+Revision ID: 9b7d2f4e6a15
+Revises: 5c1e8a3b7d92
+Create Date: 2026-10-18 18:05:27.913350
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b7d2f4e6a15'
+down_revision = '5c1e8a3b7d92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'employee',
+        sa.Column(
+            'permissions_version',
+            sa.Integer(),
+            server_default=sa.text('1'),
+            nullable=False
+        )
+    )
+
+    # The tokens carry the employee type, so changing it (however it is
+    # changed) has to invalidate them.
+    op.execute("""
+        CREATE FUNCTION bump_permissions_version() RETURNS trigger AS $$
+        BEGIN
+            NEW.permissions_version := OLD.permissions_version + 1;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER employee_permissions_version
+        BEFORE UPDATE OF employee_type_id ON employee
+        FOR EACH ROW
+        WHEN (OLD.employee_type_id IS DISTINCT FROM NEW.employee_type_id)
+        EXECUTE FUNCTION bump_permissions_version()
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER employee_permissions_version ON employee")
+    op.execute("DROP FUNCTION bump_permissions_version()")
+    op.drop_column('employee', 'permissions_version')
@@ -0,0 +1,49 @@
+"""add revoked_token table
+
+Revision ID: c4a81e5f2b30
+Revises: 9b7d2f4e6a15
+Create Date: 2026-10-18 19:02:44.180532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a81e5f2b30'
+down_revision = '9b7d2f4e6a15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'revoked_token',
+        sa.Column('jti', sa.String(), nullable=False),
+        sa.Column(
+            'expires_at',
+            sa.TIMESTAMP(timezone=True),
+            nullable=False
+        ),
+        sa.Column(
+            'revoked_at',
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.text('now()'),
+            nullable=False
+        ),
+        sa.PrimaryKeyConstraint('jti')
+    )
+    op.create_index(
+        op.f('ix_revoked_token_expires_at'),
+        'revoked_token',
+        ['expires_at'],
+        unique=False
+    )
+
+
+def downgrade():
+    op.drop_index(
+        op.f('ix_revoked_token_expires_at'),
+        table_name='revoked_token'
+    )
+    op.drop_table('revoked_token')
@@ -0,0 +1,160 @@
+# Bulk creation of task logs, ratings and reviews.
+#
+# The body is either a JSON array or NDJSON (one object per line). Every
+# item is validated on its own and gets its own status in the response,
+# the valid ones are written with a single multi-row INSERT in one
+# transaction. Their ids are taken from the sequence of the table first,
+# so that every item knows its own id whatever order the rows are
+# written in.
+
+import json
+
+from fastapi import HTTPException, Request, status
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select
+
+from . import models, response_cache
+from .missing import forget_missing
+from .streaming import NDJSON_MEDIA_TYPE
+
+# Larger batches should be split by the client
+BULK_MAX_ITEMS = 5000
+
+
+class _BadItem(Exception):
+    def __init__(self, status_code, detail):
+        self.status_code = status_code
+        self.detail = detail
+
+
+async def read_items(request: Request) -> list:
+    """
+    Reads the raw items of a bulk request body.
+
+    A line of NDJSON that is not valid JSON is kept as a _BadItem, so it
+    only fails that one item.
+    """
+    body = await request.body()
+
+    if NDJSON_MEDIA_TYPE in request.headers.get("content-type", ""):
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(_BadItem(status.HTTP_400_BAD_REQUEST, str(e)))
+    else:
+        try:
+            items = json.loads(body)
+        except ValueError:
+            items = None
+
+        if not isinstance(items, list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Expected a JSON array or an NDJSON body!"
+            )
+
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {BULK_MAX_ITEMS} items per request!"
+        )
+
+    return items
+
+
+async def bulk_create(db, model, schema, items, on_insert=None, **fields):
+    """
+    Inserts every valid item of `items` as a `model` row.
+
+    `schema` validates a single item and `fields` are set on every row
+    (the creator). `on_insert(db, rows)` is awaited with the inserted
+    rows before the commit. Returns the body of the bulk response.
+    """
+    results = []
+    rows = []
+
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, _BadItem):
+                raise item
+            rows.append((index, {**schema.parse_obj(item).dict(), **fields}))
+            results.append(None)
+        except ValidationError as e:
+            results.append({
+                "index": index,
+                "status_code": status.HTTP_422_UNPROCESSABLE_ENTITY,
+                "detail": e.errors(),
+            })
+        except _BadItem as e:
+            results.append({
+                "index": index,
+                "status_code": e.status_code,
+                "detail": e.detail,
+            })
+
+    # A row pointing at a missing initiative would fail the whole INSERT
+    # on its foreign key, so those are weeded out with one lookup first.
+    initiative_ids = {row["initiative_id"] for _, row in rows}
+    if initiative_ids:
+        found = set((await db.execute(
+            select(models.Initiative.initiative_id).where(
+                models.Initiative.initiative_id.in_(initiative_ids)
+            )
+        )).scalars())
+
+        for index, row in rows:
+            if row["initiative_id"] not in found:
+                results[index] = {
+                    "index": index,
+                    "status_code": status.HTTP_404_NOT_FOUND,
+                    "detail": f"Initiative with id: "
+                              f"{row['initiative_id']} does not exist!",
+                }
+        rows = [
+            (index, row) for index, row in rows
+            if row["initiative_id"] in found
+        ]
+
+    if rows:
+        primary_key = model.__mapper__.primary_key[0]
+
+        ids = (await db.execute(
+            select(
+                func.nextval(func.pg_get_serial_sequence(
+                    model.__tablename__,
+                    primary_key.name
+                ))
+            ).select_from(func.generate_series(1, len(rows)))
+        )).scalars().all()
+
+        rows = [
+            (index, {**row, primary_key.name: id})
+            for (index, row), id in zip(rows, ids)
+        ]
+        await db.execute(insert(model).values([row for _, row in rows]))
+
+        if on_insert is not None:
+            await on_insert(db, [row for _, row in rows])
+
+        await db.commit()
+        await response_cache.bump(model)
+        forget_missing(model, *ids)
+
+        for (index, _), id in zip(rows, ids):
+            results[index] = {
+                "index": index,
+                "status_code": status.HTTP_201_CREATED,
+                "id": id,
+            }
+
+    created = len(rows)
+
+    return {
+        "created": created,
+        "failed": len(results) - created,
+        "items": results,
+    }
@@ -0,0 +1,73 @@
+# Small in-process caches.
+#
+# Every worker process has its own copy, so an entry can be stale in the
+# other workers for up to `ttl` seconds after it was invalidated here.
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    A mapping that forgets its entries after `ttl` seconds and drops the
+    least recently used one once it holds `maxsize` entries.
+
+    A `ttl` or `maxsize` of 0 turns the cache off.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """
+        `ttl` shortens the lifetime of this one entry
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
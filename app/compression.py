@@ -0,0 +1,238 @@
+# Compression of the response bodies.
+#
+# The list endpoints send large and very repetitive JSON (the same nested
+# `creator` and `initiative` objects over and over), which gzip shrinks to
+# a fraction. Brotli is used instead when the brotli package is installed
+# and the client accepts it.
+#
+# Bodies smaller than COMPRESSION_MINIMUM_SIZE are sent as they are, and
+# streamed responses (the NDJSON exports) are compressed as they go.
+# A response that already has a Content-Encoding is left alone, which is
+# how the cached responses send their stored compressed form (see
+# Precompressed below).
+
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+
+# Optional, hence not in requirements.txt
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred first when the client accepts several equally
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def accepted_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Picks the encoding to use from an Accept-Encoding header,
+    None when the body should be sent as it is
+    """
+    if not accept_encoding or settings.compression_level <= 0:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    best = None
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > 0 and (best is None or weight > best[1]):
+            best = (encoding, weight)
+
+    return best[0] if best else None
+
+
+def compressor(encoding: str):
+    """
+    Returns (compress, finish) for a body that comes in chunks:
+    compress(chunk) and then finish() give the encoded bytes
+    """
+    if encoding == "br":
+        compressor = brotli.Compressor(
+            quality=settings.compression_brotli_quality
+        )
+        return compressor.process, compressor.finish
+
+    # wbits 31 writes the gzip header and trailer
+    compressor = zlib.compressobj(
+        settings.compression_level,
+        zlib.DEFLATED,
+        31
+    )
+    return compressor.compress, compressor.flush
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    compress, finish = compressor(encoding)
+    return compress(body) + finish()
+
+
+class Precompressed:
+    """
+    A response body kept along with its compressed forms, for the
+    response caches. Every encoding is only compressed once, for the
+    first request that asks for it.
+    """
+
+    def __init__(self, body: bytes, media_type="application/json",
+                 headers=None, encoded=None):
+        self.body = body
+        self.media_type = media_type
+        self.headers = dict(headers or {})
+        # encoding -> compressed body
+        self._encoded = dict(encoded or {})
+
+    @classmethod
+    def from_response(cls, response: Response) -> "Precompressed":
+        """
+        The body and the headers of a (not yet compressed) response
+        """
+        return cls(
+            response.body,
+            response.media_type,
+            {
+                name: value for name, value in response.headers.items()
+                if name not in ("content-length", "content-type")
+            }
+        )
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(map(len, self._encoded.values()))
+
+    def encoded(self, encoding: str) -> bytes:
+        if encoding not in self._encoded:
+            self._encoded[encoding] = compress(self.body, encoding)
+        return self._encoded[encoding]
+
+    def precompress(self) -> dict:
+        """
+        Compresses the body in every encoding that could be sent right
+        away, so that the size stays the same from then on. Returns the
+        compressed forms as {encoding: body}.
+        """
+        if len(self.body) >= settings.compression_minimum_size and \
+                settings.compression_level > 0:
+            for encoding in ENCODINGS:
+                self.encoded(encoding)
+
+        return dict(self._encoded)
+
+    def response(self, accept_encoding: Optional[str]) -> Response:
+        headers = {**self.headers, "Vary": "Accept-Encoding"}
+
+        encoding = None
+        if len(self.body) >= settings.compression_minimum_size:
+            encoding = accepted_encoding(accept_encoding)
+
+        if encoding is None:
+            body = self.body
+        else:
+            body = self.encoded(encoding)
+            headers["Content-Encoding"] = encoding
+
+        return Response(
+            content=body,
+            media_type=self.media_type,
+            headers=headers
+        )
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = accepted_encoding(
+            Headers(scope=scope).get("accept-encoding")
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressingResponder(self.app, encoding)(scope, receive, send)
+
+
+class _CompressingResponder:
+    def __init__(self, app: ASGIApp, encoding: str):
+        self.app = app
+        self.encoding = encoding
+        self.send = None
+        self.start = None
+        # None until the first part of the body decides it
+        self.compressing = None
+        self.compress = None
+        self.finish = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Held back until the body tells whether to compress
+            self.start = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressing is None:
+            headers = MutableHeaders(raw=self.start["headers"])
+            self.compressing = (
+                "content-encoding" not in headers
+                and self.start["status"] not in (204, 304)
+                and (more_body or
+                     len(body) >= settings.compression_minimum_size)
+            )
+
+            if self.compressing:
+                self.compress, self.finish = compressor(self.encoding)
+                headers["Content-Encoding"] = self.encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["content-length"]
+
+                body = self.compress(body)
+                if not more_body:
+                    body += self.finish()
+                    headers["Content-Length"] = str(len(body))
+
+            await self.send(self.start)
+
+        elif self.compressing:
+            body = self.compress(body)
+            if not more_body:
+                body += self.finish()
+
+        await self.send({
+            "type": "http.response.body",
+            "body": body,
+            "more_body": more_body,
+        })
@@ -0,0 +1,147 @@
+# Conditional GETs (ETag / If-None-Match) for the tables with an
+# `updated_at` column.
+#
+# The ETag is worked out from a small probe query instead of the response
+# itself: `updated_at` of the one row for `/info/{id}`, and the count, the
+# last key and the latest `updated_at` of the rows of the page for `/all`
+# (or the same, worked out from the rows themselves when they are cached).
+# When the client already has that version, the answer is an empty
+# 304 Not Modified and the rows are never loaded nor serialized.
+# https://developer.mozilla.org/en-US/docs/Web/HTTP/Conditional_requests
+#
+# The tags are weak (W/"..."): they follow the rows themselves, not the
+# nested objects from other tables (the name of a creator for example).
+
+import hashlib
+
+from fastapi import Request, Response, status
+from sqlalchemy import func, select
+
+from .pagination import Page
+
+
+def weak_etag(*parts) -> str:
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16)
+    return f'W/"{digest.hexdigest()}"'
+
+
+def _opaque(tag: str) -> str:
+    # If-None-Match uses the weak comparison, W/ makes no difference
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+async def row_version(db, model, *criteria):
+    """
+    `updated_at` of the one `model` row matching the criteria, None when
+    there is no such row
+    """
+    return (await db.execute(
+        select(model.updated_at).where(*criteria)
+    )).scalar()
+
+
+async def page_version(db, page: Page, statement, key) -> tuple:
+    """
+    The count, the last key and the latest `updated_at` of the rows
+    `page` is going to return out of `statement` (ordered by `key`),
+    whose model has an `updated_at` column
+    """
+    # An update moves the latest updated_at, a new or a deleted row
+    # the count or the last key of the window
+    probe = select(
+        key.label("key"),
+        key.class_.updated_at.label("updated_at")
+    )
+    if statement.whereclause is not None:
+        probe = probe.where(statement.whereclause)
+
+    window = page.filter(probe, key).limit(page.limit + 1).subquery()
+
+    return tuple((await db.execute(
+        select(
+            func.count(),
+            func.max(window.c.key),
+            func.max(window.c.updated_at)
+        )
+    )).one())
+
+
+def not_modified(request: Request, tag: str):
+    """
+    A 304 response when the If-None-Match header of the request matches
+    `tag`, else None
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return None
+
+    tags = {_opaque(value.strip()) for value in if_none_match.split(",")}
+    if "*" in tags or _opaque(tag) in tags:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": tag}
+        )
+
+    return None
+
+
+class Conditional:
+    """
+    Dependency that answers conditional GETs of an endpoint.
+
+    Usage:
+        not_modified = await conditional.check_row(db, model, *criteria)
+        if not_modified:
+            return not_modified
+    """
+
+    def __init__(self, request: Request, response: Response):
+        self.request = request
+        self.response = response
+
+    def _representation(self):
+        # The same rows are a different response with other
+        # ?fields= or on another endpoint
+        return self.request.url.path, self.request.url.query
+
+    def check(self, *parts):
+        """
+        Sets the ETag made of `parts` on the response and returns a 304
+        response when the client already has that version, else None.
+        """
+        tag = weak_etag(*self._representation(), *parts)
+        self.response.headers["ETag"] = tag
+
+        return not_modified(self.request, tag)
+
+    async def check_row(self, db, model, *criteria):
+        """
+        check() for the one `model` row matching the criteria, nothing
+        is checked when there is no such row (the endpoint sends a 404).
+        """
+        updated_at = await row_version(db, model, *criteria)
+
+        if updated_at is None:
+            return None
+
+        return self.check(updated_at)
+
+    async def check_page(self, db, page: Page, statement, key):
+        """
+        check() for the rows `page` is going to return out of `statement`
+        (ordered by `key`), see page_version()
+        """
+        return self.check(*await page_version(db, page, statement, key))
+
+    def check_rows(self, window: list, key):
+        """
+        check_page() for a page.window() of rows already in memory, with
+        the same tags as the query would give
+        """
+        keys = [getattr(row, key.key) for row in window]
+
+        return self.check(
+            len(window),
+            max(keys, default=None),
+            max((row.updated_at for row in window), default=None)
+        )
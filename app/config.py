@@ -1,3 +1,4 @@
+from typing import List, Optional
 from pydantic import BaseSettings
 
 
@@ -10,6 +11,85 @@ class Settings(BaseSettings):
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
+    # Refresh tokens get new access tokens without the password
+    refresh_token_expire_minutes: int = 60 * 24 * 7
+
+    # Use SQLAlchemy's AsyncSession on top of asyncpg instead of
+    # running the regular Session in the threadpool
+    database_async: bool = False
+
+    # Connection pool of every engine (per worker process)
+    # https://docs.sqlalchemy.org/en/14/core/pooling.html
+    database_pool_size: int = 5
+    database_max_overflow: int = 10
+    database_pool_timeout: float = 30
+    database_pool_recycle: int = -1
+    database_pool_pre_ping: bool = False
+
+    # Read replicas, e.g. DATABASE_REPLICA_URLS='["postgresql://..."]'
+    database_replica_urls: List[str] = []
+    # How long a client keeps reading from the primary after a write
+    database_primary_pin_seconds: int = 5
+
+    # Authenticated employees are cached per worker, 0 turns it off
+    principal_cache_size: int = 10000
+    principal_cache_ttl_seconds: float = 60
+    # Verified tokens, an entry never outlives the token itself
+    token_cache_size: int = 10000
+    token_cache_ttl_seconds: float = 300
+
+    # Revoked tokens: how many ids the Bloom filter of every worker is
+    # sized for and how often it is reloaded from the database
+    revocation_filter_capacity: int = 100000
+    revocation_refresh_seconds: float = 30
+
+    # Processes (per worker) that hash and check passwords,
+    # 0 runs bcrypt in the threadpool instead
+    password_hash_workers: int = 2
+
+    # Login attempts per username and per client IP: a burst, then
+    # a steady rate per minute. 0 turns the limit off.
+    login_username_burst: int = 5
+    login_username_per_minute: float = 5
+    login_ip_burst: int = 30
+    login_ip_per_minute: float = 30
+    # Share the login limits between workers, e.g. redis://localhost/0
+    # (needs the redis package)
+    login_throttle_redis_url: Optional[str] = None
+    # Proxies in front of the app that append the address of the client
+    # to X-Forwarded-For (1 for the Heroku router), see throttle.py
+    login_trusted_proxy_hops: int = 0
+
+    # Encode the list endpoints straight from the rows, skipping the
+    # validation of every row by pydantic (same JSON either way)
+    fast_json_responses: bool = False
+
+    # gzip (or brotli, when the brotli package is installed) for the
+    # responses of at least COMPRESSION_MINIMUM_SIZE bytes.
+    # A level of 0 turns compression off.
+    compression_minimum_size: int = 1000
+    compression_level: int = 6
+    compression_brotli_quality: int = 4
+
+    # Employee types, status codes and initiative types are kept in memory
+    # and reloaded at most this often, 0 turns the cache off
+    reference_cache_ttl_seconds: float = 60
+
+    # Whole responses of the busiest list endpoints, 0 turns it off.
+    # Kept in the memory of every worker up to RESPONSE_CACHE_MAX_BYTES,
+    # or shared in Redis, e.g. redis://localhost/1 (needs the redis package)
+    response_cache_ttl_seconds: float = 0
+    response_cache_max_bytes: int = 64 * 1024 * 1024
+    response_cache_redis_url: Optional[str] = None
+
+    # Identical reads arriving while one is being answered wait for
+    # its result instead of running the same queries again
+    coalesce_reads: bool = True
+
+    # Ids that /info/{id} just didn't find get their 404 without a query
+    # for a few seconds, 0 turns it off
+    missing_id_cache_size: int = 100000
+    missing_id_cache_ttl_seconds: float = 5
 
     class Config:
         env_file = ".env"
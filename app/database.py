@@ -1,36 +1,260 @@
 # Will handle our database connection
 # https://fastapi.tiangolo.com/tutorial/sql-databases/
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 
 from .config import settings
+from .pool import pool_options
 
 # Connection string. Specifies where is our SQL database located
 # Format of a SQL string
 # SQLALCHEMY_DATABASE_URL = "postgresql://<username>:password@<ip-address/hostname>/database"
 SQLALCHEMY_DATABASE_URL = f'postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}'
 
+# Same database, but through the asyncpg driver
+SQLALCHEMY_ASYNC_DATABASE_URL = f'postgresql+asyncpg://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}'
+
 # Engine is responsible for etablishing a connection for
 # SQLAlchemy to connect to postgres database.
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **pool_options())
 
 # When you talk to a SQL database we need to make use of session
+# Objects do not expire on commit, so that reading them afterwards does
+# not sneak a blocking reload into the event loop.
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
+    expire_on_commit=False,
     bind=engine
 )
 
+# The async engine is only created when it is switched on in the settings,
+# so that the sync setup keeps working without asyncpg installed.
+async_engine = None
+AsyncSessionLocal = None
+
+if settings.database_async:
+    async_engine = create_async_engine(
+        SQLALCHEMY_ASYNC_DATABASE_URL,
+        **pool_options(async_engine=True)
+    )
+
+    # Reloading an expired attribute would be implicit I/O,
+    # which AsyncSession does not allow at all.
+    AsyncSessionLocal = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+        bind=async_engine,
+        class_=AsyncSession
+    )
+
+# Read replicas. GET requests are spread over these, everything else
+# goes to the primary above. Each entry is (pool, sessionmaker).
+replicas = []
+
+for replica_url in settings.database_replica_urls:
+    if settings.database_async:
+        replica_engine = create_async_engine(
+            make_url(replica_url).set(drivername="postgresql+asyncpg"),
+            **pool_options(async_engine=True)
+        )
+        replicas.append((
+            replica_engine.sync_engine.pool,
+            sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                expire_on_commit=False,
+                bind=replica_engine,
+                class_=AsyncSession
+            )
+        ))
+    else:
+        replica_engine = create_engine(replica_url, **pool_options())
+        replicas.append((
+            replica_engine.pool,
+            sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                expire_on_commit=False,
+                bind=replica_engine
+            )
+        ))
+
+_next_replica = itertools.count()
+
+# After a write the client is sent back to the primary for
+# `database_primary_pin_seconds`, so that it can read its own writes even
+# when the replicas are lagging behind. The pin is handed out both as a
+# cookie and as a header, clients that do not keep cookies can send the
+# header back instead.
+PRIMARY_PIN_COOKIE = "primary_pin"
+PRIMARY_PIN_HEADER = "X-Primary-Pin"
+
 # Models that represent table extend the Base class.
 Base = declarative_base()
 
 
-def get_db():
-    # Gets a connection the db
-    db = SessionLocal()
+class _ThreadedScalarResult:
+    """
+    Async iteration over a streamed result of a regular Session
+    """
+
+    def __init__(self, result):
+        self._result = result
+
+    async def partitions(self, size):
+        while True:
+            rows = await run_in_threadpool(self._result.fetchmany, size)
+            if not rows:
+                break
+            yield rows
+
+
+class ThreadedSession:
+    """
+    Wraps a regular Session behind the same awaitable methods as
+    AsyncSession, so that the routers are written only once.
+
+    Each database call runs in the threadpool, which means a thread
+    is only held for the round trip and not for the whole request.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(
+            self.sync_session.execute, statement, *args, **kwargs
+        )
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(
+            self.sync_session.scalar, statement, *args, **kwargs
+        )
+
+    async def stream_scalars(self, statement, *args, **kwargs):
+        result = await run_in_threadpool(
+            self.sync_session.scalars, statement, *args, **kwargs
+        )
+        return _ThreadedScalarResult(result)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(
+            self.sync_session.get, entity, ident, **kwargs
+        )
+
+    async def refresh(self, instance, attribute_names=None):
+        await run_in_threadpool(
+            self.sync_session.refresh, instance, attribute_names
+        )
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+
+def _replica_sessionmaker():
+    """
+    Picks the replica with the fewest checked out connections,
+    going round robin between replicas that are equally busy.
+    """
+    start = next(_next_replica) % len(replicas)
+    candidates = replicas[start:] + replicas[:start]
+
+    pool, replica_session = min(
+        candidates,
+        key=lambda replica: replica[0].checkedout()
+    )
+    return replica_session
+
+
+def pin_to_primary(response):
+    if not replicas:
+        return
+
+    seconds = settings.database_primary_pin_seconds
+    until = str(time.time() + seconds)
+
+    response.set_cookie(
+        PRIMARY_PIN_COOKIE,
+        until,
+        max_age=seconds,
+        httponly=True
+    )
+    response.headers[PRIMARY_PIN_HEADER] = until
+
+
+def reads_from_replica(request: Request) -> bool:
+    """
+    Whether the reads of the request go to a replica: GET and HEAD
+    requests, unless they are pinned to the primary
+    """
+    if not replicas or request.method not in ("GET", "HEAD"):
+        return False
+
+    pinned_until = request.headers.get(PRIMARY_PIN_HEADER) \
+        or request.cookies.get(PRIMARY_PIN_COOKIE)
+
+    try:
+        return float(pinned_until) < time.time()
+    except (TypeError, ValueError):
+        return True
+
+
+@asynccontextmanager
+async def session_scope(replica=False):
+    """
+    Returns an AsyncSession when `database_async` is on, otherwise
+    a regular Session wrapped in a ThreadedSession.
+
+    With `replica=True` the session is bound to one of the read
+    replicas, if there are any.
+    """
+    if replica and replicas:
+        make_session = _replica_sessionmaker()
+    elif settings.database_async:
+        make_session = AsyncSessionLocal
+    else:
+        make_session = SessionLocal
+
+    if settings.database_async:
+        async with make_session() as db:
+            yield db
+        return
+
+    db = ThreadedSession(make_session())
 
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
+
+
+async def get_db(request: Request):
+    # Gets a connection the db
+    async with session_scope(replica=reads_from_replica(request)) as db:
+        yield db
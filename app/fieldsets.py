@@ -0,0 +1,110 @@
+# Sparse fieldsets: `?fields=task_id,description` trims a response down to
+# the listed top level fields of its schema.
+#
+# The trimmed schema is a pydantic model of its own, so the SELECT built
+# for it (see loaders.py) leaves out the columns and the joins of the
+# fields that were not asked for, and the response only carries the rest.
+
+from functools import lru_cache
+from typing import List, Optional
+
+from fastapi import HTTPException, Query, Response, status
+from pydantic import create_model
+
+from .serializers import fast_json, json_response
+
+
+@lru_cache(maxsize=None)
+def sparse_schema(schema, names: tuple):
+    """
+    `schema` with only the fields in `names`, always the same class for
+    the same fields (the loader options are cached per class)
+    """
+    fields = {
+        name: (field.annotation, field.field_info)
+        for name, field in schema.__fields__.items() if name in names
+    }
+
+    return create_model(
+        f"{schema.__name__}Fields",
+        __config__=schema.__config__,
+        **fields
+    )
+
+
+class Fieldset:
+    """
+    The schema a response is loaded and serialized with
+    """
+
+    def __init__(self, schema, names: tuple = ()):
+        self.sparse = bool(names)
+        self.schema = sparse_schema(schema, names) if names else schema
+
+    def respond(self, content, response: Response = None):
+        """
+        The endpoint's response for `content` (a row, or a list of them).
+
+        A trimmed schema doesn't fit the `response_model` of the endpoint
+        any more, so it is always encoded here.
+        """
+        if self.sparse:
+            return self.encode(content, response)
+
+        return fast_json(self._type(content), content, response)
+
+    def encode(self, content, response: Response = None) -> Response:
+        """
+        respond(), always encoded here (for the response cache)
+        """
+        return json_response(self._type(content), content, response)
+
+    def _type(self, content):
+        return List[self.schema] if isinstance(content, list) \
+            else self.schema
+
+
+class SparseFields:
+    """
+    Dependency that reads the `fields` query parameter of an endpoint
+    returning `schema`.
+
+    `allowed` is the whitelist of fields that can be asked for, every
+    top level field of the schema by default.
+
+    Usage:
+        fields: Fieldset = Depends(SparseFields(schemas.TaskLogSimple))
+    """
+
+    def __init__(self, schema, allowed=None):
+        self.schema = schema
+        self.allowed = tuple(allowed or schema.__fields__)
+
+    def __call__(
+        self,
+        fields: Optional[str] = Query(
+            None,
+            description="Comma separated fields to return, "
+                        "e.g. `?fields=task_id,description`"
+        )
+    ) -> Fieldset:
+        names = {
+            name.strip() for name in (fields or "").split(",") if name.strip()
+        }
+        if not names:
+            return Fieldset(self.schema)
+
+        unknown = names.difference(self.allowed)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}. "
+                       f"Allowed: {', '.join(self.allowed)}"
+            )
+
+        # In the order of the schema, so that the same fields always
+        # get the same trimmed schema
+        return Fieldset(
+            self.schema,
+            tuple(name for name in self.schema.__fields__ if name in names)
+        )
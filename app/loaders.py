@@ -0,0 +1,157 @@
+# Works out which relationships a response schema is going to touch and
+# builds the matching eager loading options for the query.
+#
+# Without this, serializing a list of TaskLogSimple (for example) lazy loads
+# `initiative` and `creator` one row at a time, which means one extra SELECT
+# per row per relationship (the N+1 problem).
+# https://docs.sqlalchemy.org/en/14/orm/loading_relationships.html
+#
+# Every table also only gets the columns the schema reads (plus the keys),
+# so for example the bcrypt hash never leaves the database when employees
+# are listed and an InitiativeShort doesn't drag the description along.
+# https://docs.sqlalchemy.org/en/14/orm/loading_columns.html
+
+from functools import lru_cache
+
+from pydantic import BaseModel
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+from . import reference
+
+
+def _nested_schemas(schema):
+    """
+    Yields (field name, nested schema) for every field of the schema
+    that is itself a pydantic model.
+    """
+    for name, field in schema.__fields__.items():
+        if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+            yield name, field.type_
+
+
+def _columns(model, schema, entity):
+    """
+    Returns the column attributes of `model` (as those of `entity`) that
+    serializing it as `schema` reads, or None when the schema reads
+    anything else (a property for example), in which case every column
+    is loaded.
+    """
+    mapper = inspect(model)
+    columns = {column.key for column in mapper.primary_key}
+
+    for name in schema.__fields__:
+        if name in mapper.column_attrs:
+            columns.add(name)
+        elif name in mapper.relationships:
+            # The foreign keys the relationship is loaded by
+            for column in mapper.relationships[name].local_columns:
+                columns.add(mapper.get_property_by_column(column).key)
+        else:
+            return None
+
+    return [getattr(entity, name) for name in sorted(columns)]
+
+
+def _loader_options(model, schema, parent=None, entity=None):
+    # `entity` is an alias of `model` to load from instead
+    entity = model if entity is None else entity
+    options = []
+    relationships = inspect(model).relationships
+
+    columns = _columns(model, schema, entity)
+    if columns is not None:
+        options.append(
+            load_only(*columns) if parent is None
+            else parent.load_only(*columns)
+        )
+
+    for name, nested_schema in _nested_schemas(schema):
+        if name not in relationships:
+            continue
+
+        relationship = relationships[name]
+        attribute = getattr(entity, name)
+
+        # Filled in from the cache of the reference tables instead,
+        # unless the schema reaches further into them
+        if reference.is_cached(relationship) and not any(
+            nested in relationship.mapper.relationships
+            for nested, _ in _nested_schemas(nested_schema)
+        ):
+            continue
+
+        # Many-to-one relationships are cheap to JOIN in the same query.
+        # Collections would multiply the rows, so those get a second
+        # SELECT ... WHERE id IN (...) instead.
+        if relationship.uselist:
+            loader = selectinload(attribute) if parent is None \
+                else parent.selectinload(attribute)
+        else:
+            loader = joinedload(attribute) if parent is None \
+                else parent.joinedload(attribute)
+
+        nested_options = _loader_options(
+            relationship.mapper.class_,
+            nested_schema,
+            loader
+        )
+        options.extend(nested_options or [loader])
+
+    return options
+
+
+@lru_cache(maxsize=None)
+def eager_load(model, schema):
+    """
+    Returns the loader options needed to serialize `model` rows
+    as `schema` without any lazy loads, reading only the columns
+    the schema uses.
+
+    Usage:
+        select(models.TaskLog).options(
+            *eager_load(models.TaskLog, schemas.TaskLogSimple)
+        )
+    """
+    return tuple(_loader_options(model, schema))
+
+
+def select_for(model, schema):
+    """
+    SELECT of the `model` rows with just what `schema` needs
+    """
+    return select(model).options(*eager_load(model, schema))
+
+
+def select_aliased_for(model, schema, entity):
+    """
+    select_for() of the `model` rows of `entity`, an aliased() of
+    `model` over another selectable (the RETURNING of a CTE for example)
+    """
+    return select(entity).options(
+        *_loader_options(model, schema, entity=entity)
+    )
+
+
+async def load_one(db, model, schema, *criteria):
+    """
+    Fetches the first `model` row matching the criteria, with everything
+    `schema` needs already loaded (or attached from the reference cache).
+
+    populate_existing makes sure an object that is already in the session
+    (for example one that was just created or updated) gets the current
+    values of the row instead of the ones it had before.
+    """
+    result = await db.execute(
+        select_for(model, schema).where(
+            *criteria
+        ).execution_options(
+            populate_existing=True
+        )
+    )
+    instance = result.scalars().first()
+
+    if instance is not None:
+        await reference.attach([instance])
+
+    return instance
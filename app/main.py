@@ -1,9 +1,18 @@
 # https://fastapi.tiangolo.com/tutorial/first-steps/
 # How to run the code: uvicorn app.main:app --reload
 
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
+from . import reference, utils
+from .compression import CompressionMiddleware
+from .config import settings
+from .database import PRIMARY_PIN_HEADER, pin_to_primary
+from .pagination import NEXT_CURSOR_HEADER
+from .revocation import revocations
+
 from .routers import (
     employee_type,
     employee,
@@ -13,7 +22,8 @@ from .routers import (
     initiative,
     task_log,
     review,
-    rating
+    rating,
+    metrics
 )
 
 
@@ -35,8 +45,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, PRIMARY_PIN_HEADER],
 )
 
+if settings.compression_level > 0:
+    app.add_middleware(CompressionMiddleware)
+
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+
+    if request.method not in ("GET", "HEAD") and response.status_code < 400:
+        pin_to_primary(response)
+
+    return response
+
+
+@app.on_event("startup")
+async def load_revoked_tokens():
+    app.state.revocations_task = asyncio.create_task(
+        revocations.keep_fresh()
+    )
+
+
+@app.on_event("startup")
+async def load_reference_tables():
+    await reference.load_all()
+
+
+@app.on_event("shutdown")
+def stop_background_work():
+    app.state.revocations_task.cancel()
+    utils.shutdown_password_pool()
+
+
 app.include_router(employee_type.router)
 app.include_router(employee.router)
 app.include_router(auth.router)
@@ -46,6 +89,7 @@ app.include_router(initiative.router)
 app.include_router(task_log.router)
 app.include_router(review.router)
 app.include_router(rating.router)
+app.include_router(metrics.router)
 
 
 @app.get("/")
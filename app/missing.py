@@ -0,0 +1,43 @@
+# Negative cache of the `/info/{id}` lookups.
+#
+# Scrapers and stale clients keep asking for ids that don't exist, and
+# every one of those 404s used to cost a query. The ids that were just
+# looked up and not found (or deleted) are remembered for a few seconds,
+# and asking for them again gets the 404 straight away.
+#
+# The create handlers of this worker forget the new ids right away. A row
+# created through another worker, or a miss on a replica that is lagging
+# behind, can answer 404 for up to MISSING_ID_CACHE_TTL_SECONDS.
+#
+# The misses read from a replica are kept apart from the ones read from
+# the primary: a client pinned to the primary after its own write only
+# trusts the latter (see database.reads_from_replica).
+
+from .cache import TTLCache
+from .config import settings
+
+# (table, id, read from a replica) -> True
+missing_ids = TTLCache(
+    settings.missing_id_cache_size,
+    settings.missing_id_cache_ttl_seconds
+)
+
+
+def is_missing(model, id, replica=False) -> bool:
+    return missing_ids.get((model.__tablename__, id, replica), False)
+
+
+def remember_missing(model, id, replica=False):
+    """
+    `replica` tells whether the lookup that missed went to a replica
+    """
+    missing_ids.set((model.__tablename__, id, replica), True)
+
+
+def forget_missing(model, *ids):
+    """
+    Called by the handlers that create `model` rows
+    """
+    for id in ids:
+        for replica in (False, True):
+            missing_ids.pop((model.__tablename__, id, replica))
@@ -3,7 +3,8 @@
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.schema import ForeignKey
 from .database import Base
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import BigInteger, Column, Index, Integer, String
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql.expression import text
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 
@@ -39,6 +40,14 @@ class Employee(Base):
         server_default=text('now()')
     )
 
+    # Goes up whenever employee_type_id changes (a trigger takes care of
+    # that), the tokens issued before are no longer accepted then.
+    permissions_version = Column(
+        Integer,
+        nullable=False,
+        server_default=text('1')
+    )
+
     # This is gonna create another property for us for our employee table
     # so that when we retrieve our employee details, it will fetch the
     # properties of the employee_type table
@@ -168,7 +177,8 @@ class TaskLog(Base):
     initiative_id = Column(
         Integer,
         ForeignKey("initiative.initiative_id", ondelete="CASCADE"),
-        nullable=False
+        nullable=False,
+        index=True
     )
 
     description = Column(String, nullable=False)
@@ -196,6 +206,14 @@ class TaskLog(Base):
 
 class Subscription(Base):
     __tablename__ = "subscription"
+    __table_args__ = (
+        # Looking up whether an employee is subscribed to an initiative
+        Index(
+            "ix_subscription_subscribed_by_initiative_id",
+            "subscribed_by",
+            "initiative_id"
+        ),
+    )
 
     subscription_id = Column(Integer, primary_key=True, index=True)
 
@@ -229,7 +247,8 @@ class Review(Base):
     initiative_id = Column(
         Integer,
         ForeignKey("initiative.initiative_id", ondelete="CASCADE"),
-        nullable=False
+        nullable=False,
+        index=True
     )
 
     description = Column(String, nullable=False)
@@ -264,7 +283,8 @@ class Rating(Base):
     initiative_id = Column(
         Integer,
         ForeignKey("initiative.initiative_id", ondelete="CASCADE"),
-        nullable=False
+        nullable=False,
+        index=True
     )
 
     point = Column(Integer, nullable=False)
@@ -289,3 +309,53 @@ class Rating(Base):
 
     rater = relationship("Employee", foreign_keys=[given_by])
     initiative = relationship("Initiative", foreign_keys=[initiative_id])
+
+
+# Running totals of the ratings of an initiative,
+# kept up to date by the rating endpoints (see rating_summary.py).
+class RatingSummary(Base):
+    __tablename__ = "rating_summary"
+
+    initiative_id = Column(
+        Integer,
+        ForeignKey("initiative.initiative_id", ondelete="CASCADE"),
+        primary_key=True
+    )
+
+    rating_count = Column(Integer, nullable=False, server_default=text('0'))
+    point_sum = Column(BigInteger, nullable=False, server_default=text('0'))
+    point_min = Column(Integer, nullable=True)
+    point_max = Column(Integer, nullable=True)
+
+    # {"<point>": <number of ratings with that point>}
+    histogram = Column(
+        JSONB,
+        nullable=False,
+        server_default=text("'{}'::jsonb")
+    )
+
+    @property
+    def point_avg(self):
+        if not self.rating_count:
+            return None
+        return self.point_sum / self.rating_count
+
+
+# Tokens that were revoked before they expired, see revocation.py
+class RevokedToken(Base):
+    __tablename__ = "revoked_token"
+
+    jti = Column(String, primary_key=True)
+
+    # When the token would have expired anyway, the row is useless then
+    expires_at = Column(
+        TIMESTAMP(timezone=True),
+        nullable=False,
+        index=True
+    )
+
+    revoked_at = Column(
+        TIMESTAMP(timezone=True),
+        nullable=False,
+        server_default=text('now()')
+    )
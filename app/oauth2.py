@@ -1,13 +1,20 @@
+import hashlib
+import time
+import uuid
 from datetime import datetime, timedelta
 
 from fastapi import Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from . import schemas, models, database
+from .cache import TTLCache
 from .config import settings
+from .loaders import load_one
+from .revocation import revocations
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='login')
 
@@ -18,13 +25,54 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl='login')
 SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+REFRESH_TOKEN_EXPIRE_MINUTES = settings.refresh_token_expire_minutes
+
+# sha256 of the token -> schemas.TokenData
+token_cache = TTLCache(
+    settings.token_cache_size,
+    settings.token_cache_ttl_seconds
+)
+
+# employee_id -> schemas.Principal
+principal_cache = TTLCache(
+    settings.principal_cache_size,
+    settings.principal_cache_ttl_seconds
+)
+
+# employee_id -> employee.permissions_version
+permissions_versions = TTLCache(
+    settings.principal_cache_size,
+    settings.principal_cache_ttl_seconds
+)
+
+
+def _credentials_exception(detail="Could not validate credentials"):
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+
+def employee_claims(employee: models.Employee) -> dict:
+    """
+    What the token says about the employee, enough to authorize a
+    request without looking the employee up (see get_current_principal)
+    """
+    return {
+        "employee_id": employee.employee_id,
+        "employee_type_id": employee.employee_type_id,
+        "employee_name": employee.employee_name,
+        "permissions_version": employee.permissions_version,
+    }
 
 
 def create_access_token(data: dict):
     to_encode = data.copy()
 
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # jti identifies the token when it gets revoked
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
 
     encoded_jwt = jwt.encode(
         to_encode,
@@ -34,7 +82,42 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
+def create_refresh_token(employee_id: int):
+    expire = datetime.utcnow() + timedelta(
+        minutes=REFRESH_TOKEN_EXPIRE_MINUTES
+    )
+
+    return jwt.encode(
+        {
+            "employee_id": employee_id,
+            "type": "refresh",
+            "exp": expire,
+            "jti": uuid.uuid4().hex,
+        },
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+
+
+def create_tokens(employee: models.Employee) -> dict:
+    """
+    The body of the /login and /token/refresh responses
+    """
+    return {
+        "access_token": create_access_token(employee_claims(employee)),
+        "refresh_token": create_refresh_token(employee.employee_id),
+        "token_type": "bearer"
+    }
+
+
 def verify_access_token(token: str, credentials_exception):
+    # Clients send the same token over and over again, checking its
+    # signature and parsing it once is enough.
+    key = hashlib.sha256(token.encode()).digest()
+    token_data = token_cache.get(key)
+
+    if token_data is not None:
+        return token_data
 
     try:
         payload = jwt.decode(
@@ -46,28 +129,128 @@ def verify_access_token(token: str, credentials_exception):
 
         if employee_id is None:
             raise credentials_exception
-        token_data = schemas.TokenData(employee_id=employee_id)
+        token_data = schemas.TokenData(**payload)
 
     except JWTError:
         raise credentials_exception
 
+    # A token without an expiry is not cached at all
+    token_cache.set(
+        key,
+        token_data,
+        ttl=payload.get("exp", 0) - time.time()
+    )
+
     return token_data
 
 
-def get_current_employee(
+def invalidate_principals(employee_id=None):
+    """
+    Drops one cached employee, or all of them when no id is given.
+    Call it whenever an employee (or an employee type) changes.
+    """
+    if employee_id is None:
+        principal_cache.clear()
+        permissions_versions.clear()
+    else:
+        principal_cache.pop(employee_id)
+        permissions_versions.pop(employee_id)
+
+
+async def get_token_data(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_db)
 ):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail=f"Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"}
-    )
+    """
+    Only checks the token, without looking the employee up.
 
-    token = verify_access_token(token, credentials_exception)
+    Enough for the endpoints that just need to know the caller's
+    employee_id.
+    """
+    token_data = verify_access_token(token, _credentials_exception())
 
-    employee = db.query(models.Employee).filter(
-        models.Employee.employee_id == token.employee_id
-    ).first()
+    if token_data.type is not None:
+        # A refresh token is only good for /token/refresh
+        raise _credentials_exception()
+
+    if await revocations.is_revoked(db, token_data.jti):
+        raise _credentials_exception("Token has been revoked")
+
+    return token_data
+
+
+async def verify_refresh_token(token: str, db: AsyncSession):
+    token_data = verify_access_token(token, _credentials_exception())
+
+    if token_data.type != "refresh" or token_data.jti is None:
+        raise _credentials_exception()
+
+    # Refreshing is rare enough to always ask the table: the filter of
+    # this worker may not know yet about a rotation on another worker
+    if await revocations.is_revoked(db, token_data.jti, use_filter=False):
+        raise _credentials_exception("Token has been revoked")
+
+    return token_data
+
+
+async def get_current_employee(
+    token: schemas.TokenData = Depends(get_token_data),
+    db: AsyncSession = Depends(database.get_db)
+):
+    employee = principal_cache.get(token.employee_id)
+
+    if employee is None:
+        # employee_type comes along so that /employee/me can be
+        # serialized without a lazy load.
+        employee = await load_one(
+            db,
+            models.Employee,
+            schemas.Principal,
+            models.Employee.employee_id == token.employee_id
+        )
+
+        if employee is None:
+            raise _credentials_exception()
+
+        employee = schemas.Principal.from_orm(employee)
+        principal_cache.set(token.employee_id, employee)
 
     return employee
+
+
+async def get_current_principal(
+    token: schemas.TokenData = Depends(get_token_data),
+    db: AsyncSession = Depends(database.get_db)
+):
+    """
+    The caller as described by the claims of the token, for the
+    endpoints that only need the employee's id and type.
+
+    The one thing checked against the database (and cached) is the
+    permissions version, which goes up when the employee's type changes,
+    so a role change still makes the older tokens stop working.
+    """
+    if token.permissions_version is None:
+        # Issued before the tokens carried these claims
+        return await get_current_employee(token, db)
+
+    version = permissions_versions.get(token.employee_id)
+
+    if version is None:
+        version = (await db.execute(
+            select(models.Employee.permissions_version).where(
+                models.Employee.employee_id == token.employee_id
+            )
+        )).scalar()
+
+        if version is None:
+            raise _credentials_exception()
+
+        permissions_versions.set(token.employee_id, version)
+
+    if version != token.permissions_version:
+        raise _credentials_exception(
+            "Permissions have changed, please log in again"
+        )
+
+    return token
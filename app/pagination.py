@@ -0,0 +1,158 @@
+# Keyset (a.k.a. cursor) pagination for the `/all` endpoints.
+#
+# Instead of OFFSET, every page remembers the key of its last row and the
+# next page starts with `WHERE key > last_key ORDER BY key LIMIT n`. That
+# is a plain index range scan, so page 1000 costs the same as page 1.
+# https://use-the-index-luke.com/no-offset
+
+import base64
+import binascii
+import json
+from typing import Optional
+
+from fastapi import HTTPException, Query, Response, status
+from sqlalchemy import tuple_
+
+from . import reference
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# The cursor of the next page is sent back in this header, so that the
+# body of the list endpoints stays a plain JSON array.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: list) -> str:
+    """
+    Packs the key of the last row of a page into an opaque string
+    """
+    raw = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    padding = "=" * (-len(cursor) % 4)
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (binascii.Error, ValueError):
+        values = None
+
+    if not isinstance(values, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid cursor: {cursor}"
+        )
+
+    return values
+
+
+def _of_type(value, key) -> bool:
+    python_type = key.type.python_type
+
+    # true and false decode to bools, which Python counts as ints
+    if isinstance(value, bool) and python_type is not bool:
+        return False
+
+    return isinstance(value, python_type)
+
+
+class Page:
+    """
+    Dependency that reads the `after` and `limit` query parameters
+    of a list endpoint.
+    """
+
+    def __init__(
+        self,
+        response: Response,
+        after: Optional[str] = Query(
+            None,
+            description=f"Value of the {NEXT_CURSOR_HEADER} header "
+                        "returned with the previous page"
+        ),
+        limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT)
+    ):
+        self.response = response
+        self.after = after
+        self.limit = limit
+
+    def _cursor(self, keys) -> list:
+        """
+        The values of the cursor, one of the type of each key
+        """
+        values = decode_cursor(self.after)
+
+        if len(values) != len(keys) or not all(
+            _of_type(value, key) for value, key in zip(values, keys)
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid cursor: {self.after}"
+            )
+
+        return values
+
+    def _take(self, results, keys) -> list:
+        # `results` has one row more than the page when there is a next one
+        if len(results) > self.limit:
+            results = results[:self.limit]
+            last = results[-1]
+            self.response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+                [getattr(last, key.key) for key in keys]
+            )
+
+        return results
+
+    def filter(self, statement, *keys):
+        """
+        Orders the statement by `keys` and skips everything up to
+        and including the row the cursor points at.
+        """
+        statement = statement.order_by(*keys)
+
+        if self.after is None:
+            return statement
+
+        values = self._cursor(keys)
+
+        if len(keys) == 1:
+            return statement.where(keys[0] > values[0])
+
+        return statement.where(tuple_(*keys) > tuple_(*values))
+
+    async def apply(self, db, statement, *keys):
+        """
+        Returns one page of the statement and sets the next cursor header
+        when there are more rows left.
+        """
+        # Fetching one extra row tells us whether there is a next page
+        # without running a separate COUNT(*)
+        result = await db.execute(
+            self.filter(statement, *keys).limit(self.limit + 1)
+        )
+        results = result.scalars().all()
+        await reference.attach(results)
+
+        return self._take(results, keys)
+
+    def window(self, rows: list, key) -> list:
+        """
+        filter() for rows already in memory and ordered by `key`: the
+        ones after the cursor, one more than the limit like apply() reads
+        """
+        if self.after is not None:
+            # Of the type of the key, a bad cursor is a 400 rather than
+            # a comparison failing below
+            after = self._cursor([key])[0]
+            rows = [row for row in rows if getattr(row, key.key) > after]
+
+        return rows[:self.limit + 1]
+
+    def take(self, window: list, key) -> list:
+        """
+        apply() for a window(): the page itself, and the next cursor
+        header when there are more rows left
+        """
+        return self._take(window, [key])
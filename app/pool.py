@@ -0,0 +1,98 @@
+# Connection pool settings and statistics.
+# https://docs.sqlalchemy.org/en/14/core/pooling.html
+#
+# The pools below behave exactly like SQLAlchemy's QueuePool, they only
+# count how long requests wait for a connection and how often they give up.
+
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from .config import settings
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, waited, timed_out):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+class _MeteredPoolMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        # This is where QueuePool blocks when every connection is checked
+        # out, so the time spent in here is the wait for a connection
+        # (plus the connect itself when a new one had to be opened).
+        start = time.perf_counter()
+        timed_out = False
+
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.metrics.record(time.perf_counter() - start, timed_out)
+
+    def recreate(self):
+        # engine.dispose() swaps the pool for a fresh copy,
+        # the counters should survive that.
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncAdaptedQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_options(async_engine=False):
+    """
+    Keyword arguments for create_engine() / create_async_engine()
+    """
+    return {
+        "poolclass": MeteredAsyncAdaptedQueuePool if async_engine
+        else MeteredQueuePool,
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_timeout": settings.database_pool_timeout,
+        "pool_recycle": settings.database_pool_recycle,
+        "pool_pre_ping": settings.database_pool_pre_ping,
+    }
+
+
+def pool_stats(pool):
+    metrics = pool.metrics
+
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        # QueuePool counts this up from -pool_size, it only goes above
+        # zero once connections beyond pool_size are open
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.database_max_overflow,
+        "checkouts": metrics.checkouts,
+        "timeouts": metrics.timeouts,
+        "wait_seconds_total": metrics.wait_seconds_total,
+        "wait_seconds_max": metrics.wait_seconds_max,
+    }
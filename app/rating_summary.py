@@ -0,0 +1,106 @@
+# Per initiative rating aggregates (count, sum, min, max and a histogram
+# of the points), so that an initiative's score is read from one row
+# instead of being computed over all of its ratings.
+#
+# The rating endpoints call apply_rating_changes() in the same
+# transaction as the INSERT / UPDATE / DELETE of the ratings themselves.
+# So does the delete of an employee type, whose employees' ratings are
+# deleted by ON DELETE CASCADE.
+
+from collections import Counter, defaultdict
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from . import models
+
+
+async def _lock_summaries(db, initiative_ids):
+    # Locking in initiative_id order keeps two requests that touch the
+    # same initiatives from deadlocking each other
+    result = await db.execute(
+        select(models.RatingSummary).where(
+            models.RatingSummary.initiative_id.in_(initiative_ids)
+        ).order_by(
+            models.RatingSummary.initiative_id
+        ).with_for_update().execution_options(
+            populate_existing=True
+        )
+    )
+    return result.scalars().all()
+
+
+def _apply(summary, points):
+    histogram = dict(summary.histogram)
+
+    for point, delta in points.items():
+        remaining = histogram.get(str(point), 0) + delta
+        if remaining > 0:
+            histogram[str(point)] = remaining
+        else:
+            histogram.pop(str(point), None)
+
+        summary.rating_count += delta
+        summary.point_sum += point * delta
+
+    # The histogram knows which points are left, so removing the current
+    # minimum or maximum doesn't need a look at the ratings themselves
+    remaining_points = [int(point) for point in histogram]
+    summary.point_min = min(remaining_points, default=None)
+    summary.point_max = max(remaining_points, default=None)
+    summary.histogram = histogram
+
+
+async def apply_rating_changes(db, added=(), removed=()):
+    """
+    Updates the summaries for ratings that were added and removed.
+
+    Both are iterables of (initiative_id, point), an updated rating is
+    removed with its old values and added with its new ones. The changes
+    are flushed with the session, the caller commits.
+    """
+    deltas = defaultdict(Counter)
+    for initiative_id, point in added:
+        deltas[initiative_id][point] += 1
+    for initiative_id, point in removed:
+        deltas[initiative_id][point] -= 1
+
+    # An update that keeps the initiative and the point cancels out
+    changes = {}
+    for initiative_id, points in deltas.items():
+        points = {point: delta for point, delta in points.items() if delta}
+        if points:
+            changes[initiative_id] = points
+
+    if not changes:
+        return
+
+    summaries = await _lock_summaries(db, sorted(changes))
+
+    # The first rating of an initiative also creates its summary row,
+    # ON CONFLICT covers another request having just done the same.
+    missing = sorted(
+        set(changes) - {summary.initiative_id for summary in summaries}
+    )
+    if missing:
+        await db.execute(
+            insert(models.RatingSummary).values(
+                [{"initiative_id": initiative_id} for initiative_id in missing]
+            ).on_conflict_do_nothing()
+        )
+        summaries += await _lock_summaries(db, missing)
+
+    for summary in summaries:
+        _apply(summary, changes[summary.initiative_id])
+
+
+def empty_summary(initiative_id):
+    """
+    What the summary of an initiative without ratings looks like
+    """
+    return models.RatingSummary(
+        initiative_id=initiative_id,
+        rating_count=0,
+        point_sum=0,
+        histogram={}
+    )
@@ -0,0 +1,206 @@
+# Cache of the reference tables: employee types, status codes and
+# initiative types.
+#
+# They change a few times a year but are read by almost every request,
+# as lists and nested in other objects (`init_type`, `status`,
+# `employee_type`). Every worker keeps the whole of each table in memory:
+#
+# - it is loaded at startup and reloaded on first use once it is older
+#   than REFERENCE_CACHE_TTL_SECONDS (which is how the changes made through
+#   the other workers get here) or was invalidated by a write here;
+# - the list endpoints of those tables are answered from it;
+# - the loaders (see loaders.py) don't join these tables any more, the
+#   nested objects are filled in from here by attach().
+#
+# Every invalidate() bumps the version of the table, a reload that was
+# already running when it happened doesn't count as fresh.
+#
+# The cached rows are detached ORM objects shared by all requests, they
+# are only ever read.
+
+import asyncio
+import logging
+import time
+
+from sqlalchemy import inspect, select
+from sqlalchemy.orm.attributes import set_committed_value
+
+from . import models
+from .config import settings
+from .database import session_scope
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceTable:
+    def __init__(self, model):
+        self.model = model
+        self.key = inspect(model).primary_key[0]
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = asyncio.Lock()
+        self._rows = []
+        self._by_key = {}
+        # monotonic time of the last load, None when stale
+        self._loaded_at = None
+
+    def _fresh(self):
+        return (
+            self._loaded_at is not None
+            and time.monotonic() - self._loaded_at
+            < settings.reference_cache_ttl_seconds
+        )
+
+    async def load(self):
+        version = self.version
+
+        # From the primary: right after a write a replica could still
+        # hand back the old rows
+        async with session_scope() as db:
+            rows = (await db.execute(
+                select(self.model).order_by(self.key)
+            )).scalars().all()
+
+        self._rows = rows
+        self._by_key = {getattr(row, self.key.key): row for row in rows}
+        if version == self.version:
+            self._loaded_at = time.monotonic()
+
+    async def _ensure_fresh(self):
+        if self._fresh():
+            self.hits += 1
+            return
+
+        async with self._lock:
+            if not self._fresh():
+                self.misses += 1
+                await self.load()
+
+    async def rows(self) -> list:
+        """
+        Every row of the table, ordered by primary key
+        """
+        await self._ensure_fresh()
+        return self._rows
+
+    async def get_many(self, ids) -> dict:
+        """
+        The rows with the given primary keys, as {id: row}
+        """
+        await self._ensure_fresh()
+
+        # A row created through another worker since the last load
+        if any(id is not None and id not in self._by_key for id in ids):
+            async with self._lock:
+                self.misses += 1
+                await self.load()
+
+        return self._by_key
+
+    def invalidate(self):
+        """
+        Called by the handlers that write to the table
+        """
+        self.version += 1
+        self._loaded_at = None
+
+    def stats(self):
+        return {
+            "size": len(self._rows),
+            "maxsize": None,
+            "ttl_seconds": settings.reference_cache_ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "version": self.version,
+        }
+
+
+employee_types = ReferenceTable(models.EmployeeType)
+status_codes = ReferenceTable(models.StatusCode)
+initiative_types = ReferenceTable(models.InitiativeType)
+
+tables = {
+    table.model: table
+    for table in (employee_types, status_codes, initiative_types)
+}
+
+
+def enabled():
+    return settings.reference_cache_ttl_seconds > 0
+
+
+def is_cached(relationship) -> bool:
+    """
+    Whether the loaders can leave a relationship to attach()
+    """
+    return (
+        enabled()
+        and not relationship.uselist
+        and relationship.mapper.class_ in tables
+    )
+
+
+async def load_all():
+    """
+    Warms up every table at startup
+    """
+    if not enabled():
+        return
+
+    try:
+        for table in tables.values():
+            await table.load()
+    except Exception:
+        # They get loaded by the first request that needs them instead
+        logger.exception("Could not load the reference tables")
+
+
+def _unloaded(objects):
+    """
+    Yields (object, relationship, foreign key value) for the relationships
+    to the reference tables that were left unloaded, in `objects` and in
+    the objects loaded along with them
+    """
+    seen = set()
+    pending = list(objects)
+
+    while pending:
+        obj = pending.pop()
+        if obj is None or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+
+        state = inspect(obj)
+        for relationship in state.mapper.relationships:
+            if relationship.key in state.dict:
+                value = state.dict[relationship.key]
+                pending.extend(
+                    value if relationship.uselist else [value]
+                )
+            elif is_cached(relationship):
+                column = next(iter(relationship.local_columns))
+                key = state.mapper.get_property_by_column(column).key
+                if key in state.dict:
+                    yield obj, relationship, state.dict[key]
+
+
+async def attach(objects):
+    """
+    Fills the relationships to the reference tables of the loaded
+    `objects` from the cache, the way joinedload would have
+    """
+    if not enabled():
+        return
+
+    wanted = {}
+    for obj, relationship, id in _unloaded(objects):
+        wanted.setdefault(relationship.mapper.class_, []).append(
+            (obj, relationship.key, id)
+        )
+
+    for model, links in wanted.items():
+        rows = await tables[model].get_many({id for _, _, id in links})
+        for obj, key, id in links:
+            # Without history, so that it is never flushed
+            set_committed_value(obj, key, rows.get(id))
@@ -0,0 +1,340 @@
+# Cache of whole responses for the busiest list endpoints.
+#
+# An entry is keyed by the path and the query of the request and by the
+# generation of every table the response is read from. The write handlers
+# bump the generation of the table they wrote to and of the tables it
+# cascades deletes to (see bump()), after which the entries made before the
+# write are never looked up again and simply age out.
+#
+# Entries are kept along with their compressed forms (see Precompressed).
+# In memory, the least recently used ones go once all of them add up to
+# RESPONSE_CACHE_MAX_BYTES. With RESPONSE_CACHE_REDIS_URL the entries and
+# the generations live in Redis instead and are shared by all workers (the
+# maxmemory policy of the server bounds them there).
+#
+# Off unless RESPONSE_CACHE_TTL_SECONDS is set. With the memory backend it
+# is also how long a write made through another worker can go unnoticed.
+
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+from sqlalchemy import inspect
+
+from . import models
+from .compression import Precompressed
+from .conditional import not_modified
+from .config import settings
+from .database import reads_from_replica, replicas
+
+KEY_PREFIX = "responses:"
+
+
+class MemoryResponses:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (expiry, size, Precompressed)
+        self._entries = OrderedDict()
+        # table -> generation
+        self._generations = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def generations(self, tables) -> list:
+        with self._lock:
+            return [self._generations.get(table, 0) for table in tables]
+
+    async def bump(self, tables):
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    async def get(self, key) -> Optional[Precompressed]:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    async def set(self, key, value: Precompressed, ttl):
+        size = len(key) + value.size
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self.bytes += size
+
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": None,
+                "ttl_seconds": settings.response_cache_ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class RedisResponses:
+    def __init__(self, url):
+        # Only needed for this backend, hence not in requirements.txt
+        try:
+            import redis.asyncio
+        except ImportError:
+            raise RuntimeError(
+                "RESPONSE_CACHE_REDIS_URL needs the redis package"
+            )
+
+        self._redis = redis.asyncio.from_url(url)
+        self.hits = 0
+        self.misses = 0
+
+    def _generation_keys(self, tables):
+        return [f"{KEY_PREFIX}generation:{table}" for table in tables]
+
+    async def generations(self, tables) -> list:
+        values = await self._redis.mget(self._generation_keys(tables))
+        return [int(value or 0) for value in values]
+
+    async def bump(self, tables):
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key in self._generation_keys(tables):
+                pipe.incr(key)
+            await pipe.execute()
+
+    async def get(self, key) -> Optional[Precompressed]:
+        fields = await self._redis.hgetall(KEY_PREFIX + key)
+
+        if not fields:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return Precompressed(
+            fields.pop(b"body"),
+            fields.pop(b"media_type").decode(),
+            json.loads(fields.pop(b"headers")),
+            # What is left are the compressed forms
+            {encoding.decode(): body for encoding, body in fields.items()}
+        )
+
+    async def set(self, key, value: Precompressed, ttl):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(KEY_PREFIX + key, mapping={
+                "body": value.body,
+                "media_type": value.media_type,
+                "headers": json.dumps(value.headers),
+                **value.precompress(),
+            })
+            pipe.expire(KEY_PREFIX + key, math.ceil(ttl))
+            await pipe.execute()
+
+    def stats(self):
+        # The rest is up to the Redis server
+        return {
+            "size": None,
+            "maxsize": None,
+            "ttl_seconds": settings.response_cache_ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+if settings.response_cache_redis_url:
+    responses = RedisResponses(settings.response_cache_redis_url)
+else:
+    responses = MemoryResponses(settings.response_cache_max_bytes)
+
+
+def enabled():
+    return settings.response_cache_ttl_seconds > 0
+
+
+@lru_cache(maxsize=None)
+def _cascades(table: str) -> frozenset:
+    """
+    `table` and every table a DELETE on it can reach through
+    ON DELETE CASCADE foreign keys
+    """
+    tables = {table}
+    pending = [table]
+
+    while pending:
+        parent = pending.pop()
+        for child in models.Base.metadata.tables.values():
+            for foreign_key in child.foreign_keys:
+                if foreign_key.column.table.name == parent and \
+                        (foreign_key.ondelete or "").upper() == "CASCADE" \
+                        and child.name not in tables:
+                    tables.add(child.name)
+                    pending.append(child.name)
+
+    return frozenset(tables)
+
+
+async def bump(*written):
+    """
+    Called by the handlers that write to the tables of the `written`
+    models, after the commit. The tables the database deletes rows of
+    along with them are bumped too.
+    """
+    if not enabled():
+        return
+
+    tables = set()
+    for model in written:
+        tables.update(_cascades(model.__tablename__))
+
+    await responses.bump(sorted(tables))
+
+
+@lru_cache(maxsize=None)
+def _tables(model, schema) -> tuple:
+    """
+    The tables serializing `model` rows as `schema` reads from
+    """
+    tables = {model.__tablename__}
+    relationships = inspect(model).relationships
+
+    for name, field in schema.__fields__.items():
+        nested = field.type_
+        if name in relationships and isinstance(nested, type) and \
+                issubclass(nested, BaseModel):
+            tables.update(
+                _tables(relationships[name].mapper.class_, nested)
+            )
+
+    return tuple(sorted(tables))
+
+
+class CachedResponse:
+    """
+    The cache entry of one request, see ResponseCache
+    """
+
+    def __init__(self, request: Request, tables: tuple):
+        self.request = request
+        self.tables = tables
+        self.key = None
+        self.replica = reads_from_replica(request)
+
+    async def lookup(self):
+        """
+        The cached response (or a 304 for it), None when there is none
+        """
+        if not enabled():
+            return None
+
+        generations = await responses.generations(self.tables)
+        # The same parameters in another order are the same response
+        query = sorted(self.request.query_params.multi_items())
+
+        self.key = hashlib.blake2b(
+            repr((self.request.url.path, query, generations)).encode(),
+            digest_size=16
+        ).hexdigest()
+
+        # A request pinned to the primary after a write could be handed
+        # an entry read from a replica that is lagging behind, it reads
+        # for itself (and stores what it found)
+        if replicas and not self.replica:
+            return None
+
+        entry = await responses.get(self.key)
+        if entry is None:
+            return None
+
+        tag = entry.headers.get("etag")
+        if tag is not None:
+            unchanged = not_modified(self.request, tag)
+            if unchanged:
+                return unchanged
+
+        return entry.response(self.request.headers.get("accept-encoding"))
+
+    async def entry(self, fields, content,
+                    response: Response = None) -> Precompressed:
+        """
+        fields.encode(content, response), kept for the next requests
+        """
+        entry = Precompressed.from_response(
+            fields.encode(content, response)
+        )
+
+        if self.key is not None:
+            ttl = settings.response_cache_ttl_seconds
+            if self.replica:
+                # Rows read from a lagging replica are gone from the cache
+                # by the time the writer stops being pinned to the primary
+                ttl = min(ttl, settings.database_primary_pin_seconds)
+
+            entry.precompress()
+            await responses.set(self.key, entry, ttl)
+
+        return entry
+
+    async def store(self, fields, content, response: Response = None):
+        """
+        fields.respond(content, response), kept for the next requests
+        """
+        if self.key is None:
+            return fields.respond(content, response)
+
+        entry = await self.entry(fields, content, response)
+        return entry.response(self.request.headers.get("accept-encoding"))
+
+
+class ResponseCache:
+    """
+    Dependency that caches the responses of a list endpoint returning
+    `model` rows as `schema`.
+
+    Usage:
+        cache: CachedResponse = Depends(
+            ResponseCache(models.Initiative, schemas.InitiativeSimple)
+        )
+
+        cached = await cache.lookup()
+        if cached:
+            return cached
+        ...
+        return await cache.store(fields, results, page.response)
+    """
+
+    def __init__(self, model, schema):
+        self.tables = _tables(model, schema)
+
+    def __call__(self, request: Request) -> CachedResponse:
+        return CachedResponse(request, self.tables)
@@ -0,0 +1,112 @@
+# UPDATE / DELETE that hand the affected row back in the same statement.
+# https://www.postgresql.org/docs/current/dml-returning.html
+#
+# The handlers used to SELECT the row, check it, UPDATE it and SELECT it
+# again. Putting the checks in the WHERE clause and reading the row from
+# RETURNING turns that into a single round trip.
+#
+# The response of an update also needs the nested objects of the row
+# (its creator, its initiative...). Those are joined to the RETURNING in
+# the same statement: WITH updated AS (UPDATE ... RETURNING *) SELECT ...
+# FROM updated JOIN ... The main query doesn't see the changes of the
+# UPDATE, which is why the row itself is read from `updated`.
+
+from sqlalchemy import delete, inspect, select, update
+from sqlalchemy.orm import aliased
+
+from . import reference
+from .loaders import select_aliased_for
+
+
+async def update_returning(db, model, values, *criteria, schema=None):
+    """
+    Runs UPDATE model SET values WHERE criteria RETURNING *
+
+    Returns the updated object, or None when no row matched. With a
+    `schema`, the object comes with everything serializing it as `schema`
+    needs, loaded by the same statement.
+    """
+    if schema is not None:
+        loaded = await _update_loaded(db, model, schema, values, criteria)
+        return loaded and loaded[0]
+
+    statement = select(model).from_statement(
+        update(model).where(
+            *criteria
+        ).values(
+            **values
+        ).returning(
+            *model.__table__.c
+        )
+    ).execution_options(
+        populate_existing=True
+    )
+
+    result = await db.execute(statement)
+    return result.scalars().first()
+
+
+async def update_returning_previous(db, model, schema, values, *criteria,
+                                    previous):
+    """
+    update_returning() with a `schema`, which also reads the `previous`
+    columns of the row as they were before the UPDATE.
+
+    The row is locked by the same statement (SELECT ... FOR UPDATE)
+    before it is updated, so the old values are those of the latest
+    version of the row. Returns (object, previous values), or None
+    when no row matched.
+    """
+    return await _update_loaded(db, model, schema, values, criteria, previous)
+
+
+async def _update_loaded(db, model, schema, values, criteria, previous=()):
+    statement = update(model).where(*criteria).values(**values)
+    returning = list(model.__table__.c)
+
+    if previous:
+        key = inspect(model).primary_key[0]
+        locked = select(key, *previous).where(
+            *criteria
+        ).with_for_update().cte("previous")
+
+        statement = statement.where(key == locked.c[key.name])
+        returning += [
+            locked.c[column.key].label(f"previous_{column.key}")
+            for column in previous
+        ]
+
+    updated = statement.returning(*returning).cte("updated")
+    entity = aliased(model, updated)
+
+    result = await db.execute(
+        select_aliased_for(model, schema, entity).add_columns(
+            *(updated.c[f"previous_{column.key}"] for column in previous)
+        ).execution_options(
+            populate_existing=True
+        )
+    )
+    row = result.first()
+
+    if row is None:
+        return None
+
+    await reference.attach([row[0]])
+    return row[0], tuple(row[1:])
+
+
+async def delete_returning(db, model, *criteria, columns=None):
+    """
+    Runs DELETE FROM model WHERE criteria RETURNING columns
+
+    `columns` defaults to the primary key. Returns the deleted row, or
+    None when no row matched.
+    """
+    statement = delete(model).where(
+        *criteria
+    ).returning(
+        *(columns or inspect(model).primary_key)
+    )
+
+    result = await db.execute(statement)
+    return result.first()
@@ -0,0 +1,139 @@
+# Revoked tokens.
+#
+# The `jti` of every revoked token is stored in the revoked_token table
+# until the token would have expired anyway. Each worker keeps a Bloom
+# filter of those ids, rebuilt from the table every
+# REVOCATION_REFRESH_SECONDS, so that checking a token that was not
+# revoked (nearly every request) costs no I/O. Only when the filter says
+# "maybe" is the table asked.
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from . import models
+from .bloom import BloomFilter
+from .config import settings
+from .database import session_scope
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        # None until the first load from the database
+        self._filter = None
+        # (time, jti) of the tokens recently revoked by this worker
+        self._recent = deque()
+
+    def _add(self, jti):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+            self._recent.append((time.monotonic(), jti))
+
+    def might_contain(self, jti):
+        # Before the first load every token has to be looked up
+        current = self._filter
+        return current is None or jti in current
+
+    async def is_revoked(self, db, jti, use_filter=True) -> bool:
+        """
+        `use_filter=False` always asks the table, for when a token revoked
+        by another worker a moment ago must not get through
+        """
+        if jti is None:
+            return False
+        if use_filter and not self.might_contain(jti):
+            return False
+
+        revoked = (await db.execute(
+            select(models.RevokedToken.jti).where(
+                models.RevokedToken.jti == jti
+            )
+        )).first()
+
+        return revoked is not None
+
+    async def revoke(self, db, jti, exp) -> bool:
+        """
+        Adds a token to the denylist, the caller commits.
+        `exp` is the token's own expiry (a unix timestamp).
+
+        Returns False when the token was already revoked. A concurrent
+        revoke of the same token waits on the row until this transaction
+        ends, so only one of them ever gets True.
+        """
+        inserted = (await db.execute(
+            insert(models.RevokedToken).values(
+                jti=jti,
+                expires_at=datetime.fromtimestamp(exp, timezone.utc)
+            ).on_conflict_do_nothing().returning(
+                models.RevokedToken.jti
+            )
+        )).first()
+        self._add(jti)
+
+        return inserted is not None
+
+    async def rebuild(self):
+        """
+        Reloads the filter from the table, dropping the ids of the
+        tokens that have expired in the meantime
+        """
+        async with session_scope() as db:
+            await db.execute(
+                delete(models.RevokedToken).where(
+                    models.RevokedToken.expires_at < func.now()
+                ).execution_options(
+                    synchronize_session=False
+                )
+            )
+            jtis = (await db.execute(
+                select(models.RevokedToken.jti)
+            )).scalars().all()
+            await db.commit()
+
+        # Sized for twice the current ids, so that the false
+        # positive rate holds until the next rebuild
+        bloom = BloomFilter(max(self.capacity, 2 * len(jtis)))
+        for jti in jtis:
+            bloom.add(jti)
+
+        with self._lock:
+            # A token revoked here may not have been committed yet when
+            # the table was read, those are carried over for a while
+            keep_after = time.monotonic() - 2 * max(
+                settings.revocation_refresh_seconds,
+                60
+            )
+            while self._recent and self._recent[0][0] < keep_after:
+                self._recent.popleft()
+            for _, jti in self._recent:
+                bloom.add(jti)
+
+            self._filter = bloom
+
+    async def keep_fresh(self):
+        """
+        Rebuilds the filter every REVOCATION_REFRESH_SECONDS, so that
+        tokens revoked by other workers are picked up
+        """
+        while True:
+            try:
+                await self.rebuild()
+            except Exception:
+                logger.exception("Could not reload the revoked tokens")
+
+            await asyncio.sleep(settings.revocation_refresh_seconds)
+
+
+revocations = RevocationList(settings.revocation_filter_capacity)
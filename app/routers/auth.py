@@ -1,9 +1,14 @@
-from fastapi import APIRouter,  Depends, status, HTTPException
+from fastapi import (
+    APIRouter,  Depends, Request, Response, status, HTTPException
+)
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .. import models, schemas, utils, oauth2
 from ..database import get_db
+from ..revocation import revocations
+from ..throttle import throttle_login
 
 router = APIRouter(tags=['Authentication'])
 
@@ -12,13 +17,19 @@ router = APIRouter(tags=['Authentication'])
     '/login',
     response_model=schemas.Token
 )
-def login(
+async def login(
+    request: Request,
     employee_credentials: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    employee = db.query(models.Employee).filter(
-        models.Employee.email == employee_credentials.username
-    ).first()
+    # Before anything touches the database or bcrypt
+    await throttle_login(request, employee_credentials.username)
+
+    employee = (await db.execute(
+        select(models.Employee).where(
+            models.Employee.email == employee_credentials.username
+        )
+    )).scalars().first()
 
     if not employee:
         raise HTTPException(
@@ -27,7 +38,7 @@ def login(
         )
 
     # if the passwords do not match
-    if not utils.verify(
+    if not await utils.verify_async(
         employee_credentials.password,
         employee.password
     ):
@@ -37,12 +48,67 @@ def login(
         )
 
     # Create a Token & return it
-    access_token = oauth2.create_access_token(
-        data={
-            "employee_id": employee.employee_id
-        }
+    return oauth2.create_tokens(employee)
+
+
+@router.post(
+    '/token/refresh',
+    response_model=schemas.Token
+)
+async def refresh_token(
+    body: schemas.RefreshRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Trades a refresh token for a new access token (and a new refresh
+    token, the one sent in is revoked), no password needed.
+    """
+    token = await oauth2.verify_refresh_token(body.refresh_token, db)
+
+    # The claims of the new access token have to be current
+    employee = await db.get(models.Employee, token.employee_id)
+
+    if employee is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    # Claims the refresh token: of two requests racing with the same
+    # token only one gets new tokens
+    if not await revocations.revoke(db, token.jti, token.exp):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    await db.commit()
+
+    return oauth2.create_tokens(employee)
+
+
+@router.post(
+    '/token/revoke',
+    status_code=status.HTTP_204_NO_CONTENT
+)
+async def revoke_token(
+    body: schemas.RevokeRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Revokes an access or a refresh token, e.g. on logout
+    """
+    token = oauth2.verify_access_token(
+        body.token,
+        HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid token!"
+        )
     )
-    return {
-        "access_token": access_token,
-        "token_type": "bearer"
-    }
+
+    if token.jti is not None:
+        await revocations.revoke(db, token.jti, token.exp)
+        await db.commit()
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,21 +1,34 @@
 from typing import List
-from fastapi import status, HTTPException, Response, Depends, APIRouter
-from sqlalchemy.orm import Session
-from .. import models, schemas, utils, oauth2
-from ..database import get_db
+from fastapi import status, HTTPException, Request, Response, Depends, APIRouter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import models, schemas, utils, oauth2, response_cache
+from ..database import get_db, reads_from_replica
+from ..fieldsets import Fieldset, SparseFields
+from ..loaders import load_one, select_for
+from ..missing import forget_missing, is_missing, remember_missing
+from ..pagination import Page
 
 router = APIRouter(
     prefix='/employee',
     tags=['Employees']
 )
 
+# Anyone can list the employees. `?fields=email` alone would make a
+# compact list of every address, so the email only comes along with
+# the whole record.
+employee_fields = SparseFields(
+    schemas.Employee,
+    allowed=("employee_id", "employee_name", "employee_type", "created_at")
+)
+
 
 @router.get(
     '/me',
     response_model=schemas.Employee
 )
 # @router.get('/')
-def get_current_employee(
+async def get_current_employee(
     current_employee: int = Depends(oauth2.get_current_employee)
 ):
     return current_employee
@@ -23,11 +36,14 @@ def get_current_employee(
 
 @router.get('/all', response_model=List[schemas.Employee])
 # @router.get('/')
-def get_employees(
-    db: Session = Depends(get_db)
+async def get_employees(
+    db: AsyncSession = Depends(get_db),
+    page: Page = Depends(),
+    fields: Fieldset = Depends(employee_fields),
 ):
-    results = db.query(models.Employee).all()
-    return results
+    statement = select_for(models.Employee, fields.schema)
+    results = await page.apply(db, statement, models.Employee.employee_id)
+    return fields.respond(results, page.response)
 
 
 @router.post(
@@ -35,20 +51,23 @@ def get_employees(
     status_code=status.HTTP_201_CREATED,
     response_model=schemas.EmployeeOut
 )
-def create_employee(
+async def create_employee(
     employee: schemas.EmployeeCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Inserting a new employee into the database
     """
-    hashed_password = utils.hash(employee.password)
+    # bcrypt is CPU bound, keep it off the event loop
+    hashed_password = await utils.hash_async(employee.password)
     employee.password = hashed_password
 
     new_user = models.Employee(**employee.dict())
 
-    db_user = db.query(models.Employee).filter(
-        models.Employee.email == new_user.email).first()
+    db_user = (await db.execute(
+        select(models.Employee).where(
+            models.Employee.email == new_user.email)
+    )).scalars().first()
 
     if db_user:
         raise HTTPException(
@@ -57,8 +76,10 @@ def create_employee(
         )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await response_cache.bump(models.Employee)
+    forget_missing(models.Employee, new_user.employee_id)
+    await db.refresh(new_user)
 
     return new_user
 
@@ -67,18 +88,30 @@ def create_employee(
     '/info/{id}',
     response_model=schemas.Employee
 )
-def get_employee(
+async def get_employee(
     id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    fields: Fieldset = Depends(employee_fields),
 ):
-    employee = db.query(
-        models.Employee
-    ).filter(
+    # Looked up and not found a moment ago, see missing.py
+    replica = reads_from_replica(request)
+    if is_missing(models.Employee, id, replica):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Employee with id: {id} does not exist!"
+        )
+
+    employee = await load_one(
+        db,
+        models.Employee,
+        fields.schema,
         models.Employee.employee_id == id
-    ).first()
+    )
     if not employee:
+        remember_missing(models.Employee, id, replica)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Employee with id: {id} does not exist!"
         )
-    return employee
+    return fields.respond(employee)
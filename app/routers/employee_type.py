@@ -1,9 +1,15 @@
 from fastapi import status, HTTPException, Response, Depends, APIRouter
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database import get_db
-from .. import models, schemas, oauth2
+from ..fieldsets import Fieldset, SparseFields
+from ..loaders import load_one, select_for
+from ..pagination import Page
+from ..rating_summary import apply_rating_changes
+from ..returning import delete_returning, update_returning
+from .. import models, schemas, oauth2, reference, response_cache
 
 # Using hyphen by following this answer
 # https://stackoverflow.com/a/18449772
@@ -18,9 +24,11 @@ router = APIRouter(
     response_model=List[schemas.EmployeeType]
 )
 # @router.get('/')
-def get_employee_types(
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+async def get_employee_types(
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal),
+    page: Page = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.EmployeeType)),
 ):
 
     if current_employee.employee_type_id != 1:
@@ -29,8 +37,22 @@ def get_employee_types(
             detail=f"Not Authorized to perform requested action!"
         )
 
-    results = db.query(models.EmployeeType).all()
-    return results
+    if reference.enabled():
+        # Straight from the cache, see reference.py
+        window = page.window(
+            await reference.employee_types.rows(),
+            models.EmployeeType.employee_type_id
+        )
+        results = page.take(window, models.EmployeeType.employee_type_id)
+        return fields.respond(results, page.response)
+
+    statement = select_for(models.EmployeeType, fields.schema)
+    results = await page.apply(
+        db,
+        statement,
+        models.EmployeeType.employee_type_id
+    )
+    return fields.respond(results, page.response)
 
 
 @router.post(
@@ -38,10 +60,10 @@ def get_employee_types(
     status_code=status.HTTP_201_CREATED,
     response_model=schemas.EmployeeType,
 )
-def create_employee_type(
+async def create_employee_type(
     empl_type: schemas.EmployeeTypeCreate,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal)
 ):
 
     new_empl_type = models.EmployeeType(**empl_type.dict())
@@ -56,8 +78,10 @@ def create_employee_type(
         )
 
     db.add(new_empl_type)
-    db.commit()
-    db.refresh(new_empl_type)
+    await db.commit()
+    await response_cache.bump(models.EmployeeType)
+    reference.employee_types.invalidate()
+    await db.refresh(new_empl_type)
 
     return new_empl_type
 
@@ -66,12 +90,13 @@ def create_employee_type(
     '/info/{id}',
     response_model=schemas.EmployeeType
 )
-def get_employee_type(
+async def get_employee_type(
     id: int,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal),
+    fields: Fieldset = Depends(SparseFields(schemas.EmployeeType)),
 ):
-    """ 
+    """
     {id} is a path parameter
     """
     # We are
@@ -90,9 +115,12 @@ def get_employee_type(
             detail=f"Not Authorized to perform requested action!"
         )
 
-    empl_type = db.query(models.EmployeeType).filter(
+    empl_type = await load_one(
+        db,
+        models.EmployeeType,
+        fields.schema,
         models.EmployeeType.employee_type_id == id
-    ).first()
+    )
 
     if not empl_type:
         raise HTTPException(
@@ -100,17 +128,17 @@ def get_employee_type(
             detail=f"Employee Type with id: {id} not found!"
         )
 
-    return empl_type
+    return fields.respond(empl_type)
 
 
 @router.delete(
     '/delete/{id}',
     status_code=status.HTTP_204_NO_CONTENT
 )
-def delete_employee_type(
+async def delete_employee_type(
     id: int,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal)
 ):
 
     if current_employee.employee_type_id != 1:
@@ -119,18 +147,44 @@ def delete_employee_type(
             detail=f"Not Authorized to perform requested action!"
         )
 
-    empl_type_query = db.query(models.EmployeeType).filter(
-        models.EmployeeType.employee_type_id == id)
-    empl_type = empl_type_query.first()
+    # The employees of the type go with it (ON DELETE CASCADE), and so do
+    # the ratings they gave, which have to leave the summaries first.
+    # Summaries of initiatives that cascade away as well go with them.
+    ratings = await db.execute(
+        select(models.Rating.initiative_id, models.Rating.point).join(
+            models.Employee,
+            models.Employee.employee_id == models.Rating.given_by
+        ).where(
+            models.Employee.employee_type_id == id
+        )
+    )
+    await apply_rating_changes(db, removed=ratings.all())
+    # Before the DELETE takes the summaries of cascaded initiatives along
+    await db.flush()
 
-    if empl_type is None:
+    deleted = await delete_returning(
+        db,
+        models.EmployeeType,
+        models.EmployeeType.employee_type_id == id
+    )
+
+    if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Employee Type with id: {id} does not exist!"
         )
 
-    empl_type_query.delete(synchronize_session=False)
-    db.commit()
+    await db.commit()
+    # Bumps the tables the DELETE cascaded to as well
+    await response_cache.bump(models.EmployeeType)
+    reference.employee_types.invalidate()
+    # The status codes and initiative types created or last updated by
+    # the employees of the type went with them
+    reference.status_codes.invalidate()
+    reference.initiative_types.invalidate()
+
+    # Cached employees carry their employee type
+    oauth2.invalidate_principals()
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -140,11 +194,11 @@ def delete_employee_type(
     '/update/{id}',
     response_model=schemas.EmployeeType
 )
-def update_employee_type(
+async def update_employee_type(
     id: int,
     updated_empl_type: schemas.EmployeeTypeCreate,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal)
 ):
 
     if current_employee.employee_type_id != 1:
@@ -153,25 +207,25 @@ def update_employee_type(
             detail=f"Not Authorized to perform requested action!"
         )
 
-    empl_type_query = db.query(
-        models.EmployeeType
-    ).filter(
+    empl_type = await update_returning(
+        db,
+        models.EmployeeType,
+        updated_empl_type.dict(),
         models.EmployeeType.employee_type_id == id
     )
 
-    empl_type = empl_type_query.first()
-
     if empl_type is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Employee Type with id: {id} does not exist!"
         )
 
-    empl_type_query.update(
-        updated_empl_type.dict(),
-        synchronize_session=False
-    )
-    db.commit()
+    await db.commit()
+    await response_cache.bump(models.EmployeeType)
+    reference.employee_types.invalidate()
+
+    # Cached employees carry their employee type
+    oauth2.invalidate_principals()
 
     # Sending the updated empl_type back to the user
-    return empl_type_query.first()
+    return empl_type
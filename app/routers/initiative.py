@@ -1,10 +1,19 @@
-from datetime import datetime
-from fastapi import status, HTTPException, Response, Depends, APIRouter
+from fastapi import status, HTTPException, Request, Response, Depends, APIRouter
 from typing import List
-from sqlalchemy.orm import Session
-
-from ..database import get_db
-from .. import models, schemas, oauth2
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..compression import Precompressed
+from ..conditional import Conditional, row_version
+from ..database import get_db, reads_from_replica
+from ..fieldsets import Fieldset, SparseFields
+from ..loaders import load_one, select_for
+from ..missing import forget_missing, is_missing, remember_missing
+from ..pagination import Page
+from ..response_cache import CachedResponse, ResponseCache
+from ..returning import delete_returning, update_returning
+from ..singleflight import Coalesced
+from .. import models, schemas, oauth2, response_cache
 
 # Using hyphen by following this answer
 # https://stackoverflow.com/a/18449772
@@ -19,11 +28,29 @@ router = APIRouter(
     response_model=List[schemas.InitiativeSimple]
 )
 # @router.get('/')
-def get_initiatives(
-    db: Session = Depends(get_db),
+async def get_initiatives(
+    db: AsyncSession = Depends(get_db),
+    page: Page = Depends(),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.InitiativeSimple)),
+    cache: CachedResponse = Depends(
+        ResponseCache(models.Initiative, schemas.InitiativeSimple)
+    ),
 ):
-    results = db.query(models.Initiative).all()
-    return results
+    cached = await cache.lookup()
+    if cached:
+        return cached
+
+    statement = select_for(models.Initiative, fields.schema)
+
+    not_modified = await conditional.check_page(
+        db, page, statement, models.Initiative.initiative_id
+    )
+    if not_modified:
+        return not_modified
+
+    results = await page.apply(db, statement, models.Initiative.initiative_id)
+    return await cache.store(fields, results, page.response)
 
 
 @router.post(
@@ -31,10 +58,10 @@ def get_initiatives(
     status_code=status.HTTP_201_CREATED,
     response_model=schemas.InitiativeSimple,
 )
-def create_initiative(
+async def create_initiative(
     status_code: schemas.InitiativeCreate,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal)
 ):
 
     # Allowing only the admins to proceed
@@ -54,22 +81,32 @@ def create_initiative(
     # This prevents us from specifiying individual fields
 
     db.add(new_initiative)
-    db.commit()
-    db.refresh(new_initiative)
-
-    return new_initiative
+    await db.commit()
+    await response_cache.bump(models.Initiative)
+    forget_missing(models.Initiative, new_initiative.initiative_id)
+
+    return await load_one(
+        db,
+        models.Initiative,
+        schemas.InitiativeSimple,
+        models.Initiative.initiative_id == new_initiative.initiative_id
+    )
 
 
 @router.get(
     '/info/{id}',
     response_model=schemas.InitiativeComplete
 )
-def get_initiative(
+async def get_initiative(
     id: int,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.InitiativeComplete)),
+    coalesced: Coalesced = Depends(),
 ):
-    """ 
+    """
     {id} is a path parameter
     """
     # We are
@@ -88,27 +125,57 @@ def get_initiative(
             detail=f"Not Authorized to perform requested action!"
         )
 
-    initiative = db.query(models.Initiative).filter(
-        models.Initiative.initiative_id == id
-    ).first()
-
-    if not initiative:
+    # Looked up and not found a moment ago, see missing.py
+    replica = reads_from_replica(request)
+    if is_missing(models.Initiative, id, replica):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Initiative with id: {id} not found!"
         )
 
-    return initiative
+    # Both steps are shared by the identical requests in flight,
+    # see singleflight.py
+    updated_at = await coalesced.run(
+        "version",
+        lambda: row_version(
+            db, models.Initiative, models.Initiative.initiative_id == id
+        )
+    )
+    if updated_at is not None:
+        not_modified = conditional.check(updated_at)
+        if not_modified:
+            return not_modified
+
+    async def load():
+        initiative = await load_one(
+            db,
+            models.Initiative,
+            fields.schema,
+            models.Initiative.initiative_id == id
+        )
+
+        if not initiative:
+            remember_missing(models.Initiative, id, replica)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Initiative with id: {id} not found!"
+            )
+
+        return Precompressed.from_response(
+            fields.encode(initiative, conditional.response)
+        )
+
+    return await coalesced.respond(("body", updated_at), load)
 
 
 @router.delete(
     '/delete/{id}',
     status_code=status.HTTP_204_NO_CONTENT
 )
-def delete_initiative(
+async def delete_initiative(
     id: int,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal)
 ):
 
     if current_employee.employee_type_id != 1:
@@ -117,21 +184,21 @@ def delete_initiative(
             detail=f"Not Authorized to perform requested action!"
         )
 
-    initiative_query = db.query(
-        models.Initiative
-    ).filter(
-        models.Initiative.status_id == id
+    deleted = await delete_returning(
+        db,
+        models.Initiative,
+        models.Initiative.initiative_id == id
     )
-    initiative = initiative_query.first()
 
-    if initiative is None:
+    if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Initiative with id: {id} does not exist!"
         )
 
-    initiative_query.delete(synchronize_session=False)
-    db.commit()
+    await db.commit()
+    await response_cache.bump(models.Initiative)
+    remember_missing(models.Initiative, id)
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -141,11 +208,11 @@ def delete_initiative(
     '/update/{id}',
     response_model=schemas.InitiativeUpdate
 )
-def update_initiative(
+async def update_initiative(
     id: int,
     updated_initiative: schemas.InitiativeCreate,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal)
 ):
 
     print(updated_initiative)
@@ -155,13 +222,19 @@ def update_initiative(
             detail=f"Not Authorized to perform requested action!"
         )
 
-    initiative_query = db.query(
-        models.Initiative
-    ).filter(
-        models.Initiative.status_id == id
-    )
+    # print(status_code.__dict__)
+    updated_init_type = updated_initiative.dict()
+    updated_init_type["updated_by"] = current_employee.employee_id
+    updated_init_type["updated_at"] = func.now()
 
-    initiative = initiative_query.first()
+    # print(updated_init_type)
+    initiative = await update_returning(
+        db,
+        models.Initiative,
+        updated_init_type,
+        models.Initiative.initiative_id == id,
+        schema=schemas.InitiativeUpdate
+    )
 
     if initiative is None:
         raise HTTPException(
@@ -169,17 +242,8 @@ def update_initiative(
             detail=f"Initiative Type with id: {id} does not exist!"
         )
 
-    # print(status_code.__dict__)
-    updated_init_type = updated_initiative.dict()
-    updated_init_type["updated_by"] = current_employee.employee_id
-    updated_init_type["updated_at"] = datetime.now().astimezone()
-
-    # print(updated_init_type)
-    initiative_query.update(
-        updated_init_type,
-        synchronize_session=False
-    )
-    db.commit()
+    await db.commit()
+    await response_cache.bump(models.Initiative)
 
     # Sending the updated empl_type back to the user
-    return initiative_query.first()
+    return initiative
@@ -1,10 +1,15 @@
-from datetime import datetime
 from fastapi import status, HTTPException, Response, Depends, APIRouter
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..conditional import Conditional
 from ..database import get_db
-from .. import models, schemas, oauth2
+from ..fieldsets import Fieldset, SparseFields
+from ..loaders import load_one, select_for
+from ..pagination import Page
+from ..returning import delete_returning, update_returning
+from .. import models, schemas, oauth2, reference, response_cache
 
 # Using hyphen by following this answer
 # https://stackoverflow.com/a/18449772
@@ -19,11 +24,42 @@ router = APIRouter(
     response_model=List[schemas.InitiativeType]
 )
 # @router.get('/')
-def get_initiative_types(
-    db: Session = Depends(get_db),
+async def get_initiative_types(
+    db: AsyncSession = Depends(get_db),
+    page: Page = Depends(),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.InitiativeType)),
 ):
-    results = db.query(models.InitiativeType).all()
-    return results
+    if reference.enabled():
+        # Straight from the cache, see reference.py
+        window = page.window(
+            await reference.initiative_types.rows(),
+            models.InitiativeType.initiative_type_id
+        )
+
+        not_modified = conditional.check_rows(
+            window, models.InitiativeType.initiative_type_id
+        )
+        if not_modified:
+            return not_modified
+
+        results = page.take(window, models.InitiativeType.initiative_type_id)
+        return fields.respond(results, page.response)
+
+    statement = select_for(models.InitiativeType, fields.schema)
+
+    not_modified = await conditional.check_page(
+        db, page, statement, models.InitiativeType.initiative_type_id
+    )
+    if not_modified:
+        return not_modified
+
+    results = await page.apply(
+        db,
+        statement,
+        models.InitiativeType.initiative_type_id
+    )
+    return fields.respond(results, page.response)
 
 
 @router.post(
@@ -31,10 +67,10 @@ def get_initiative_types(
     status_code=status.HTTP_201_CREATED,
     response_model=schemas.InitiativeType,
 )
-def create_initiative_type(
+async def create_initiative_type(
     initiative_type: schemas.InitiativeTypeCreate,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal)
 ):
 
     # Allowing only the admins to proceed
@@ -54,8 +90,10 @@ def create_initiative_type(
     # This prevents us from specifiying individual fields
 
     db.add(new_initiative_type)
-    db.commit()
-    db.refresh(new_initiative_type)
+    await db.commit()
+    await response_cache.bump(models.InitiativeType)
+    reference.initiative_types.invalidate()
+    await db.refresh(new_initiative_type)
 
     return new_initiative_type
 
@@ -64,12 +102,14 @@ def create_initiative_type(
     '/info/{id}',
     response_model=schemas.InitiativeTypeComplete
 )
-def get_initiative_type(
+async def get_initiative_type(
     id: int,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.InitiativeTypeComplete)),
 ):
-    """ 
+    """
     {id} is a path parameter
     """
     # We are
@@ -88,9 +128,20 @@ def get_initiative_type(
             detail=f"Not Authorized to perform requested action!"
         )
 
-    initiative_type = db.query(models.InitiativeType).filter(
+    not_modified = await conditional.check_row(
+        db,
+        models.InitiativeType,
+        models.InitiativeType.initiative_type_id == id
+    )
+    if not_modified:
+        return not_modified
+
+    initiative_type = await load_one(
+        db,
+        models.InitiativeType,
+        fields.schema,
         models.InitiativeType.initiative_type_id == id
-    ).first()
+    )
 
     if not initiative_type:
         raise HTTPException(
@@ -98,17 +149,17 @@ def get_initiative_type(
             detail=f"Initiative Type with id: {id} not found!"
         )
 
-    return initiative_type
+    return fields.respond(initiative_type, conditional.response)
 
 
 @router.delete(
     '/delete/{id}',
     status_code=status.HTTP_204_NO_CONTENT
 )
-def delete_initiative_type(
+async def delete_initiative_type(
     id: int,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal)
 ):
 
     if current_employee.employee_type_id != 1:
@@ -117,21 +168,21 @@ def delete_initiative_type(
             detail=f"Not Authorized to perform requested action!"
         )
 
-    initiative_type_query = db.query(
-        models.InitiativeType
-    ).filter(
+    deleted = await delete_returning(
+        db,
+        models.InitiativeType,
         models.InitiativeType.initiative_type_id == id
     )
-    initiative_type = initiative_type_query.first()
 
-    if initiative_type is None:
+    if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Initiative Type with id: {id} does not exist!"
         )
 
-    initiative_type_query.delete(synchronize_session=False)
-    db.commit()
+    await db.commit()
+    await response_cache.bump(models.InitiativeType)
+    reference.initiative_types.invalidate()
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -141,11 +192,11 @@ def delete_initiative_type(
     '/update/{id}',
     response_model=schemas.InitiativeTypeUpdate
 )
-def update_initiative_type(
+async def update_initiative_type(
     id: int,
     updated_initiative_type: schemas.InitiativeTypeCreate,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal)
 ):
 
     print(updated_initiative_type)
@@ -155,31 +206,28 @@ def update_initiative_type(
             detail=f"Not Authorized to perform requested action!"
         )
 
-    initiative_type_query = db.query(
-        models.InitiativeType
-    ).filter(
+    # print(initiative_type.__dict__)
+    updated_init_type = updated_initiative_type.dict()
+    updated_init_type["updated_by"] = current_employee.employee_id
+    updated_init_type["updated_at"] = func.now()
+
+    # print(updated_init_type)
+    initiative_type = await update_returning(
+        db,
+        models.InitiativeType,
+        updated_init_type,
         models.InitiativeType.initiative_type_id == id
     )
 
-    initiative_type = initiative_type_query.first()
-
     if initiative_type is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Initiative Type with id: {id} does not exist!"
         )
 
-    # print(initiative_type.__dict__)
-    updated_init_type = updated_initiative_type.dict()
-    updated_init_type["updated_by"] = current_employee.employee_id
-    updated_init_type["updated_at"] = datetime.now().astimezone()
-
-    # print(updated_init_type)
-    initiative_type_query.update(
-        updated_init_type,
-        synchronize_session=False
-    )
-    db.commit()
+    await db.commit()
+    await response_cache.bump(models.InitiativeType)
+    reference.initiative_types.invalidate()
 
     # Sending the updated empl_type back to the user
-    return initiative_type_query.first()
+    return initiative_type
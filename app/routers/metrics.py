@@ -0,0 +1,67 @@
+from typing import Dict
+from fastapi import APIRouter
+
+from .. import database, oauth2, reference, response_cache, schemas
+from ..missing import missing_ids
+from ..pool import pool_stats
+from ..singleflight import flights
+
+router = APIRouter(
+    prefix='/metrics',
+    tags=['Metrics']
+)
+
+
+@router.get(
+    '/db-pool',
+    response_model=Dict[str, schemas.PoolStats]
+)
+async def get_db_pool_stats():
+    """
+    Connection pool usage of this worker, per engine
+    """
+    results = {
+        "primary": pool_stats(database.engine.pool)
+    }
+
+    if database.async_engine is not None:
+        results["primary_async"] = pool_stats(
+            database.async_engine.sync_engine.pool
+        )
+
+    for number, (pool, replica_session) in enumerate(database.replicas):
+        results[f"replica_{number}"] = pool_stats(pool)
+
+    return results
+
+
+@router.get(
+    '/caches',
+    response_model=Dict[str, schemas.CacheStats]
+)
+async def get_cache_stats():
+    """
+    Hits and misses of the in-process caches of this worker
+    """
+    return {
+        "tokens": oauth2.token_cache.stats(),
+        "principals": oauth2.principal_cache.stats(),
+        "permissions_versions": oauth2.permissions_versions.stats(),
+        "employee_types": reference.employee_types.stats(),
+        "status_codes": reference.status_codes.stats(),
+        "initiative_types": reference.initiative_types.stats(),
+        "responses": response_cache.responses.stats(),
+        "missing_ids": missing_ids.stats(),
+    }
+
+
+@router.get(
+    '/coalescing',
+    response_model=schemas.CoalescingStats
+)
+async def get_coalescing_stats():
+    """
+    Reads of this worker that were run, and that waited for an identical
+    one in flight instead
+    """
+    return flights.stats()
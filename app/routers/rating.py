@@ -1,10 +1,23 @@
-from datetime import datetime
-from fastapi import status, HTTPException, Response, Depends, APIRouter
+from fastapi import (
+    status, HTTPException, Query, Request, Response, Depends, APIRouter
+)
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..bulk import bulk_create, read_items
+from ..conditional import Conditional, page_version
 from ..database import get_db
-from .. import models, schemas, oauth2
+from ..fieldsets import Fieldset, SparseFields
+from ..loaders import load_one, select_for
+from ..pagination import MAX_LIMIT, Page
+from ..rating_summary import apply_rating_changes, empty_summary
+from ..response_cache import CachedResponse, ResponseCache
+from ..returning import delete_returning, update_returning_previous
+from ..serializers import fast_json
+from ..singleflight import Coalesced
+from ..streaming import ndjson_response, wants_ndjson
+from .. import models, schemas, oauth2, response_cache
 
 # Using hyphen by following this answer
 # https://stackoverflow.com/a/18449772
@@ -19,11 +32,34 @@ router = APIRouter(
     response_model=List[schemas.RatingSimple]
 )
 # @router.get('/')
-def get_ratings(
-    db: Session = Depends(get_db),
+async def get_ratings(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    page: Page = Depends(),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.RatingSimple)),
 ):
-    results = db.query(models.Rating).all()
-    return results
+    """
+    Send `Accept: application/x-ndjson` to stream every row
+    (starting after the `after` cursor) instead of a single page.
+    """
+    statement = select_for(models.Rating, fields.schema)
+
+    if wants_ndjson(request):
+        return ndjson_response(
+            request,
+            page.filter(statement, models.Rating.rating_id),
+            fields.schema
+        )
+
+    not_modified = await conditional.check_page(
+        db, page, statement, models.Rating.rating_id
+    )
+    if not_modified:
+        return not_modified
+
+    results = await page.apply(db, statement, models.Rating.rating_id)
+    return fields.respond(results, page.response)
 
 
 @router.get(
@@ -31,14 +67,94 @@ def get_ratings(
     response_model=List[schemas.RatingSimple]
 )
 # @router.get('/')
-def get_all_ratings_for_a_initiative(
+async def get_all_ratings_for_a_initiative(
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    page: Page = Depends(),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.RatingSimple)),
+    cache: CachedResponse = Depends(
+        ResponseCache(models.Rating, schemas.RatingSimple)
+    ),
+    coalesced: Coalesced = Depends(),
 ):
-    results = db.query(models.Rating).filter(
+    cached = await cache.lookup()
+    if cached:
+        return cached
+
+    statement = select_for(models.Rating, fields.schema).where(
         models.Rating.initiative_id == id
-    ).all()
-    return results
+    )
+
+    # Both steps are shared by the identical requests in flight,
+    # see singleflight.py
+    version = await coalesced.run(
+        "version",
+        lambda: page_version(db, page, statement, models.Rating.rating_id)
+    )
+    not_modified = conditional.check(*version)
+    if not_modified:
+        return not_modified
+
+    async def load():
+        results = await page.apply(db, statement, models.Rating.rating_id)
+        return await cache.entry(fields, results, page.response)
+
+    return await coalesced.respond(("body", version), load)
+
+
+@router.get(
+    '/summary',
+    response_model=List[schemas.RatingSummary]
+)
+async def get_rating_summaries(
+    ids: List[int] = Query(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Summaries of the initiatives given as `?ids=1&ids=2...`, in that
+    order. An initiative without ratings gets an empty summary.
+    """
+    if len(ids) > MAX_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_LIMIT} ids per request!"
+        )
+
+    summaries = (await db.execute(
+        select(models.RatingSummary).where(
+            models.RatingSummary.initiative_id.in_(ids)
+        )
+    )).scalars().all()
+
+    found = {summary.initiative_id: summary for summary in summaries}
+    return fast_json(
+        List[schemas.RatingSummary],
+        [found.get(id) or empty_summary(id) for id in dict.fromkeys(ids)]
+    )
+
+
+@router.get(
+    '/summary/initiative/{id}',
+    response_model=schemas.RatingSummary
+)
+async def get_rating_summary(
+    id: int,
+    db: AsyncSession = Depends(get_db),
+):
+    summary = await db.get(models.RatingSummary, id)
+
+    if summary is None:
+        # No summary yet either means no ratings yet or no initiative
+        if await db.get(models.Initiative, id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Initiative with id: {id} not found!"
+            )
+
+        summary = empty_summary(id)
+
+    return summary
 
 
 @router.post(
@@ -46,10 +162,10 @@ def get_all_ratings_for_a_initiative(
     status_code=status.HTTP_201_CREATED,
     response_model=schemas.RatingSimple,
 )
-def create_rating(
+async def create_rating(
     rating: schemas.RatingCreate,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: schemas.TokenData = Depends(oauth2.get_token_data)
 ):
 
     new_rating = models.Rating(
@@ -61,21 +177,67 @@ def create_rating(
     # This prevents us from specifiying individual fields
 
     db.add(new_rating)
-    db.commit()
-    db.refresh(new_rating)
+    await apply_rating_changes(
+        db,
+        added=[(new_rating.initiative_id, new_rating.point)]
+    )
+    await db.commit()
+    await response_cache.bump(models.Rating)
+
+    return await load_one(
+        db,
+        models.Rating,
+        schemas.RatingSimple,
+        models.Rating.rating_id == new_rating.rating_id
+    )
+
+
+async def _summarize_new_ratings(db, rows):
+    await apply_rating_changes(
+        db,
+        added=[(row["initiative_id"], row["point"]) for row in rows]
+    )
+
+
+@router.post(
+    '/bulk',
+    response_model=schemas.BulkResult,
+)
+async def create_ratings_in_bulk(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_employee: schemas.TokenData = Depends(oauth2.get_token_data)
+):
+    """
+    Takes a JSON array of `RatingCreate` objects, or the same objects
+    as NDJSON (`Content-Type: application/x-ndjson`).
 
-    return new_rating
+    Every item gets its own status, a bad item doesn't stop the others
+    from being created.
+    """
+    items = await read_items(request)
+
+    return await bulk_create(
+        db,
+        models.Rating,
+        schemas.RatingCreate,
+        items,
+        on_insert=_summarize_new_ratings,
+        given_by=current_employee.employee_id
+    )
 
 
 @router.get(
     '/info/{id}',
     response_model=schemas.RatingComplete
 )
-def get_rating(
+async def get_rating(
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.RatingComplete)),
 ):
-    """ 
+    """
     {id} is a path parameter
     """
     # We are
@@ -88,9 +250,18 @@ def get_rating(
     # error later. Don't know the reason for the error yet.
     # post = cursor.fetchone()
 
-    rating = db.query(models.Rating).filter(
+    not_modified = await conditional.check_row(
+        db, models.Rating, models.Rating.rating_id == id
+    )
+    if not_modified:
+        return not_modified
+
+    rating = await load_one(
+        db,
+        models.Rating,
+        fields.schema,
         models.Rating.rating_id == id
-    ).first()
+    )
 
     if not rating:
         raise HTTPException(
@@ -98,40 +269,44 @@ def get_rating(
             detail=f"Rating with id: {id} not found!"
         )
 
-    return rating
+    return fields.respond(rating, conditional.response)
 
 
 @router.delete(
     '/delete/{id}',
     status_code=status.HTTP_204_NO_CONTENT
 )
-def delete_rating(
+async def delete_rating(
     id: int,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: schemas.TokenData = Depends(oauth2.get_token_data)
 ):
 
-    rating_query = db.query(
-        models.Rating
-    ).filter(
-        models.Rating.rating_id == id
+    deleted = await delete_returning(
+        db,
+        models.Rating,
+        models.Rating.rating_id == id,
+        models.Rating.given_by == current_employee.employee_id,
+        columns=(models.Rating.initiative_id, models.Rating.point)
     )
-    rating = rating_query.first()
 
-    if rating is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Rating with id: {id} does not exist!"
-        )
+    if not deleted:
+        # Only a failed delete pays for this lookup, it tells
+        # a missing rating apart from someone else's rating
+        if await db.get(models.Rating, id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Rating with id: {id} does not exist!"
+            )
 
-    if current_employee.employee_id != rating.given_by:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"Not Authorized to perform requested action!"
         )
 
-    rating_query.delete(synchronize_session=False)
-    db.commit()
+    await apply_rating_changes(db, removed=[deleted])
+    await db.commit()
+    await response_cache.bump(models.Rating)
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -141,43 +316,51 @@ def delete_rating(
     '/update/{id}',
     response_model=schemas.RatingUpdate
 )
-def update_rating(
+async def update_rating(
     id: int,
     updated_rating: schemas.RatingCreate,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: schemas.TokenData = Depends(oauth2.get_token_data)
 ):
 
-    rating_query = db.query(
-        models.Rating
-    ).filter(
-        models.Rating.rating_id == id
+    # print(status_code.__dict__)
+    updated_init_type = updated_rating.dict()
+    updated_init_type["updated_at"] = func.now()
+
+    # The summary has to take back the old point, which the same
+    # statement reads (and locks until the commit) before the UPDATE
+    updated = await update_returning_previous(
+        db,
+        models.Rating,
+        schemas.RatingUpdate,
+        updated_init_type,
+        models.Rating.rating_id == id,
+        models.Rating.given_by == current_employee.employee_id,
+        previous=(models.Rating.initiative_id, models.Rating.point)
     )
 
-    rating = rating_query.first()
+    if updated is None:
+        # Only a failed update pays for this lookup, it tells
+        # a missing rating apart from someone else's rating
+        if await db.get(models.Rating, id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Rating with id: {id} does not exist!"
+            )
 
-    if rating is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Rating with id: {id} does not exist!"
-        )
-
-    if current_employee.employee_id != rating.given_by:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"Not Authorized to perform requested action!"
         )
 
-    # print(status_code.__dict__)
-    updated_init_type = updated_rating.dict()
-    updated_init_type["updated_at"] = datetime.now().astimezone()
-
-    # print(updated_init_type)
-    rating_query.update(
-        updated_init_type,
-        synchronize_session=False
+    rating, previous = updated
+    await apply_rating_changes(
+        db,
+        added=[(rating.initiative_id, rating.point)],
+        removed=[previous]
     )
-    db.commit()
+    await db.commit()
+    await response_cache.bump(models.Rating)
 
     # Sending the updated empl_type back to the user
-    return rating_query.first()
+    return rating
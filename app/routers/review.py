@@ -1,10 +1,18 @@
-from datetime import datetime
-from fastapi import status, HTTPException, Response, Depends, APIRouter
+from fastapi import status, HTTPException, Request, Response, Depends, APIRouter
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..bulk import bulk_create, read_items
+from ..conditional import Conditional
 from ..database import get_db
-from .. import models, schemas, oauth2
+from ..fieldsets import Fieldset, SparseFields
+from ..loaders import load_one, select_for
+from ..pagination import Page
+from ..response_cache import CachedResponse, ResponseCache
+from ..returning import delete_returning, update_returning
+from ..streaming import ndjson_response, wants_ndjson
+from .. import models, schemas, oauth2, response_cache
 
 # Using hyphen by following this answer
 # https://stackoverflow.com/a/18449772
@@ -19,11 +27,34 @@ router = APIRouter(
     response_model=List[schemas.ReviewSimple]
 )
 # @router.get('/')
-def get_reviews(
-    db: Session = Depends(get_db),
+async def get_reviews(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    page: Page = Depends(),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.ReviewSimple)),
 ):
-    results = db.query(models.Review).all()
-    return results
+    """
+    Send `Accept: application/x-ndjson` to stream every row
+    (starting after the `after` cursor) instead of a single page.
+    """
+    statement = select_for(models.Review, fields.schema)
+
+    if wants_ndjson(request):
+        return ndjson_response(
+            request,
+            page.filter(statement, models.Review.review_id),
+            fields.schema
+        )
+
+    not_modified = await conditional.check_page(
+        db, page, statement, models.Review.review_id
+    )
+    if not_modified:
+        return not_modified
+
+    results = await page.apply(db, statement, models.Review.review_id)
+    return fields.respond(results, page.response)
 
 
 @router.get(
@@ -31,14 +62,32 @@ def get_reviews(
     response_model=List[schemas.ReviewSimple]
 )
 # @router.get('/')
-def get_all_reviews_for_a_initiative(
+async def get_all_reviews_for_a_initiative(
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    page: Page = Depends(),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.ReviewSimple)),
+    cache: CachedResponse = Depends(
+        ResponseCache(models.Review, schemas.ReviewSimple)
+    ),
 ):
-    results = db.query(models.Review).filter(
+    cached = await cache.lookup()
+    if cached:
+        return cached
+
+    statement = select_for(models.Review, fields.schema).where(
         models.Review.initiative_id == id
-    ).all()
-    return results
+    )
+
+    not_modified = await conditional.check_page(
+        db, page, statement, models.Review.review_id
+    )
+    if not_modified:
+        return not_modified
+
+    results = await page.apply(db, statement, models.Review.review_id)
+    return await cache.store(fields, results, page.response)
 
 
 @router.post(
@@ -46,10 +95,10 @@ def get_all_reviews_for_a_initiative(
     status_code=status.HTTP_201_CREATED,
     response_model=schemas.ReviewSimple,
 )
-def create_review(
+async def create_review(
     review: schemas.ReviewCreate,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: schemas.TokenData = Depends(oauth2.get_token_data)
 ):
 
     new_review = models.Review(
@@ -61,21 +110,55 @@ def create_review(
     # This prevents us from specifiying individual fields
 
     db.add(new_review)
-    db.commit()
-    db.refresh(new_review)
+    await db.commit()
+    await response_cache.bump(models.Review)
+
+    return await load_one(
+        db,
+        models.Review,
+        schemas.ReviewSimple,
+        models.Review.review_id == new_review.review_id
+    )
+
+
+@router.post(
+    '/bulk',
+    response_model=schemas.BulkResult,
+)
+async def create_reviews_in_bulk(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_employee: schemas.TokenData = Depends(oauth2.get_token_data)
+):
+    """
+    Takes a JSON array of `ReviewCreate` objects, or the same objects
+    as NDJSON (`Content-Type: application/x-ndjson`).
 
-    return new_review
+    Every item gets its own status, a bad item doesn't stop the others
+    from being created.
+    """
+    items = await read_items(request)
+
+    return await bulk_create(
+        db,
+        models.Review,
+        schemas.ReviewCreate,
+        items,
+        given_by=current_employee.employee_id
+    )
 
 
 @router.get(
     '/info/{id}',
     response_model=schemas.ReviewComplete
 )
-def get_review(
+async def get_review(
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.ReviewComplete)),
 ):
-    """ 
+    """
     {id} is a path parameter
     """
     # We are
@@ -88,9 +171,18 @@ def get_review(
     # error later. Don't know the reason for the error yet.
     # post = cursor.fetchone()
 
-    review = db.query(models.Review).filter(
+    not_modified = await conditional.check_row(
+        db, models.Review, models.Review.review_id == id
+    )
+    if not_modified:
+        return not_modified
+
+    review = await load_one(
+        db,
+        models.Review,
+        fields.schema,
         models.Review.review_id == id
-    ).first()
+    )
 
     if not review:
         raise HTTPException(
@@ -98,40 +190,42 @@ def get_review(
             detail=f"Review with id: {id} not found!"
         )
 
-    return review
+    return fields.respond(review, conditional.response)
 
 
 @router.delete(
     '/delete/{id}',
     status_code=status.HTTP_204_NO_CONTENT
 )
-def delete_review(
+async def delete_review(
     id: int,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: schemas.TokenData = Depends(oauth2.get_token_data)
 ):
 
-    review_query = db.query(
-        models.Review
-    ).filter(
-        models.Review.review_id == id
+    deleted = await delete_returning(
+        db,
+        models.Review,
+        models.Review.review_id == id,
+        models.Review.given_by == current_employee.employee_id
     )
-    review = review_query.first()
 
-    if review is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Review with id: {id} does not exist!"
-        )
+    if not deleted:
+        # Only a failed delete pays for this lookup, it tells
+        # a missing review apart from someone else's review
+        if await db.get(models.Review, id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Review with id: {id} does not exist!"
+            )
 
-    if current_employee.employee_id != review.given_by:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"Not Authorized to perform requested action!"
         )
 
-    review_query.delete(synchronize_session=False)
-    db.commit()
+    await db.commit()
+    await response_cache.bump(models.Review)
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -141,43 +235,43 @@ def delete_review(
     '/update/{id}',
     response_model=schemas.ReviewUpdate
 )
-def update_review(
+async def update_review(
     id: int,
     updated_review: schemas.ReviewCreate,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: schemas.TokenData = Depends(oauth2.get_token_data)
 ):
 
-    review_query = db.query(
-        models.Review
-    ).filter(
-        models.Review.review_id == id
-    )
+    # print(status_code.__dict__)
+    updated_init_type = updated_review.dict()
+    updated_init_type["updated_at"] = func.now()
 
-    review = review_query.first()
+    # print(updated_init_type)
+    review = await update_returning(
+        db,
+        models.Review,
+        updated_init_type,
+        models.Review.review_id == id,
+        models.Review.given_by == current_employee.employee_id,
+        schema=schemas.ReviewUpdate
+    )
 
     if review is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Review with id: {id} does not exist!"
-        )
+        # Only a failed update pays for this lookup, it tells
+        # a missing review apart from someone else's review
+        if await db.get(models.Review, id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Review with id: {id} does not exist!"
+            )
 
-    if current_employee.employee_id != review.given_by:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"Not Authorized to perform requested action!"
         )
 
-    # print(status_code.__dict__)
-    updated_init_type = updated_review.dict()
-    updated_init_type["updated_at"] = datetime.now().astimezone()
-
-    # print(updated_init_type)
-    review_query.update(
-        updated_init_type,
-        synchronize_session=False
-    )
-    db.commit()
+    await db.commit()
+    await response_cache.bump(models.Review)
 
     # Sending the updated empl_type back to the user
-    return review_query.first()
+    return review
@@ -1,10 +1,15 @@
-from datetime import datetime
 from fastapi import status, HTTPException, Response, Depends, APIRouter
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..conditional import Conditional
 from ..database import get_db
-from .. import models, schemas, oauth2
+from ..fieldsets import Fieldset, SparseFields
+from ..loaders import load_one, select_for
+from ..pagination import Page
+from ..returning import delete_returning, update_returning
+from .. import models, schemas, oauth2, reference, response_cache
 
 # Using hyphen by following this answer
 # https://stackoverflow.com/a/18449772
@@ -19,11 +24,38 @@ router = APIRouter(
     response_model=List[schemas.StatusCode]
 )
 # @router.get('/')
-def get_status_codes(
-    db: Session = Depends(get_db),
+async def get_status_codes(
+    db: AsyncSession = Depends(get_db),
+    page: Page = Depends(),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.StatusCode)),
 ):
-    results = db.query(models.StatusCode).all()
-    return results
+    if reference.enabled():
+        # Straight from the cache, see reference.py
+        window = page.window(
+            await reference.status_codes.rows(),
+            models.StatusCode.status_id
+        )
+
+        not_modified = conditional.check_rows(
+            window, models.StatusCode.status_id
+        )
+        if not_modified:
+            return not_modified
+
+        results = page.take(window, models.StatusCode.status_id)
+        return fields.respond(results, page.response)
+
+    statement = select_for(models.StatusCode, fields.schema)
+
+    not_modified = await conditional.check_page(
+        db, page, statement, models.StatusCode.status_id
+    )
+    if not_modified:
+        return not_modified
+
+    results = await page.apply(db, statement, models.StatusCode.status_id)
+    return fields.respond(results, page.response)
 
 
 @router.post(
@@ -31,10 +63,10 @@ def get_status_codes(
     status_code=status.HTTP_201_CREATED,
     response_model=schemas.StatusCode,
 )
-def create_status_code(
+async def create_status_code(
     status_code: schemas.StatusCodeCreate,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal)
 ):
 
     # Allowing only the admins to proceed
@@ -54,8 +86,10 @@ def create_status_code(
     # This prevents us from specifiying individual fields
 
     db.add(new_status_code)
-    db.commit()
-    db.refresh(new_status_code)
+    await db.commit()
+    await response_cache.bump(models.StatusCode)
+    reference.status_codes.invalidate()
+    await db.refresh(new_status_code)
 
     return new_status_code
 
@@ -64,12 +98,14 @@ def create_status_code(
     '/info/{id}',
     response_model=schemas.StatusCodeComplete
 )
-def get_status_code(
+async def get_status_code(
     id: int,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.StatusCodeComplete)),
 ):
-    """ 
+    """
     {id} is a path parameter
     """
     # We are
@@ -88,9 +124,18 @@ def get_status_code(
             detail=f"Not Authorized to perform requested action!"
         )
 
-    status_code = db.query(models.StatusCode).filter(
+    not_modified = await conditional.check_row(
+        db, models.StatusCode, models.StatusCode.status_id == id
+    )
+    if not_modified:
+        return not_modified
+
+    status_code = await load_one(
+        db,
+        models.StatusCode,
+        fields.schema,
         models.StatusCode.status_id == id
-    ).first()
+    )
 
     if not status_code:
         raise HTTPException(
@@ -98,17 +143,17 @@ def get_status_code(
             detail=f"Status Code with id: {id} not found!"
         )
 
-    return status_code
+    return fields.respond(status_code, conditional.response)
 
 
 @router.delete(
     '/delete/{id}',
     status_code=status.HTTP_204_NO_CONTENT
 )
-def delete_status_code(
+async def delete_status_code(
     id: int,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal)
 ):
 
     if current_employee.employee_type_id != 1:
@@ -117,21 +162,21 @@ def delete_status_code(
             detail=f"Not Authorized to perform requested action!"
         )
 
-    status_code_query = db.query(
-        models.StatusCode
-    ).filter(
+    deleted = await delete_returning(
+        db,
+        models.StatusCode,
         models.StatusCode.status_id == id
     )
-    status_code = status_code_query.first()
 
-    if status_code is None:
+    if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Status Code with id: {id} does not exist!"
         )
 
-    status_code_query.delete(synchronize_session=False)
-    db.commit()
+    await db.commit()
+    await response_cache.bump(models.StatusCode)
+    reference.status_codes.invalidate()
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -141,11 +186,11 @@ def delete_status_code(
     '/update/{id}',
     response_model=schemas.StatusCodeUpdate
 )
-def update_status_code(
+async def update_status_code(
     id: int,
     updated_status_code: schemas.StatusCodeCreate,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: int = Depends(oauth2.get_current_principal)
 ):
 
     print(updated_status_code)
@@ -155,31 +200,28 @@ def update_status_code(
             detail=f"Not Authorized to perform requested action!"
         )
 
-    status_code_query = db.query(
-        models.StatusCode
-    ).filter(
+    # print(status_code.__dict__)
+    updated_init_type = updated_status_code.dict()
+    updated_init_type["updated_by"] = current_employee.employee_id
+    updated_init_type["updated_at"] = func.now()
+
+    # print(updated_init_type)
+    status_code = await update_returning(
+        db,
+        models.StatusCode,
+        updated_init_type,
         models.StatusCode.status_id == id
     )
 
-    status_code = status_code_query.first()
-
     if status_code is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Initiative Type with id: {id} does not exist!"
         )
 
-    # print(status_code.__dict__)
-    updated_init_type = updated_status_code.dict()
-    updated_init_type["updated_by"] = current_employee.employee_id
-    updated_init_type["updated_at"] = datetime.now().astimezone()
-
-    # print(updated_init_type)
-    status_code_query.update(
-        updated_init_type,
-        synchronize_session=False
-    )
-    db.commit()
+    await db.commit()
+    await response_cache.bump(models.StatusCode)
+    reference.status_codes.invalidate()
 
     # Sending the updated empl_type back to the user
-    return status_code_query.first()
+    return status_code
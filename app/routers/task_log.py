@@ -1,10 +1,19 @@
-from datetime import datetime
-from fastapi import status, HTTPException, Response, Depends, APIRouter
+from fastapi import status, HTTPException, Request, Response, Depends, APIRouter
 from typing import List
-from sqlalchemy.orm import Session
-
-from ..database import get_db
-from .. import models, schemas, oauth2
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..bulk import bulk_create, read_items
+from ..conditional import Conditional
+from ..database import get_db, reads_from_replica
+from ..fieldsets import Fieldset, SparseFields
+from ..loaders import load_one, select_for
+from ..missing import forget_missing, is_missing, remember_missing
+from ..pagination import Page
+from ..response_cache import CachedResponse, ResponseCache
+from ..returning import delete_returning, update_returning
+from ..streaming import ndjson_response, wants_ndjson
+from .. import models, schemas, oauth2, response_cache
 
 # Using hyphen by following this answer
 # https://stackoverflow.com/a/18449772
@@ -19,11 +28,34 @@ router = APIRouter(
     response_model=List[schemas.TaskLogSimple]
 )
 # @router.get('/')
-def get_task_logs(
-    db: Session = Depends(get_db),
+async def get_task_logs(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    page: Page = Depends(),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.TaskLogSimple)),
 ):
-    results = db.query(models.TaskLog).all()
-    return results
+    """
+    Send `Accept: application/x-ndjson` to stream every row
+    (starting after the `after` cursor) instead of a single page.
+    """
+    statement = select_for(models.TaskLog, fields.schema)
+
+    if wants_ndjson(request):
+        return ndjson_response(
+            request,
+            page.filter(statement, models.TaskLog.task_id),
+            fields.schema
+        )
+
+    not_modified = await conditional.check_page(
+        db, page, statement, models.TaskLog.task_id
+    )
+    if not_modified:
+        return not_modified
+
+    results = await page.apply(db, statement, models.TaskLog.task_id)
+    return fields.respond(results, page.response)
 
 
 @router.get(
@@ -31,14 +63,32 @@ def get_task_logs(
     response_model=List[schemas.TaskLogSimple]
 )
 # @router.get('/')
-def get_task_logs_for_a_initiative(
+async def get_task_logs_for_a_initiative(
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    page: Page = Depends(),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.TaskLogSimple)),
+    cache: CachedResponse = Depends(
+        ResponseCache(models.TaskLog, schemas.TaskLogSimple)
+    ),
 ):
-    results = db.query(models.TaskLog).filter(
+    cached = await cache.lookup()
+    if cached:
+        return cached
+
+    statement = select_for(models.TaskLog, fields.schema).where(
         models.TaskLog.initiative_id == id
-    ).all()
-    return results
+    )
+
+    not_modified = await conditional.check_page(
+        db, page, statement, models.TaskLog.task_id
+    )
+    if not_modified:
+        return not_modified
+
+    results = await page.apply(db, statement, models.TaskLog.task_id)
+    return await cache.store(fields, results, page.response)
 
 
 @router.post(
@@ -46,10 +96,10 @@ def get_task_logs_for_a_initiative(
     status_code=status.HTTP_201_CREATED,
     response_model=schemas.TaskLogSimple,
 )
-def create_task_log(
+async def create_task_log(
     task_log: schemas.TaskLogCreate,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: schemas.TokenData = Depends(oauth2.get_token_data)
 ):
 
     new_task_log = models.TaskLog(
@@ -61,21 +111,57 @@ def create_task_log(
     # This prevents us from specifiying individual fields
 
     db.add(new_task_log)
-    db.commit()
-    db.refresh(new_task_log)
+    await db.commit()
+    await response_cache.bump(models.TaskLog)
+    forget_missing(models.TaskLog, new_task_log.task_id)
+
+    return await load_one(
+        db,
+        models.TaskLog,
+        schemas.TaskLogSimple,
+        models.TaskLog.task_id == new_task_log.task_id
+    )
 
-    return new_task_log
+
+@router.post(
+    '/bulk',
+    response_model=schemas.BulkResult,
+)
+async def create_task_logs_in_bulk(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_employee: schemas.TokenData = Depends(oauth2.get_token_data)
+):
+    """
+    Takes a JSON array of `TaskLogCreate` objects, or the same objects
+    as NDJSON (`Content-Type: application/x-ndjson`).
+
+    Every item gets its own status, a bad item doesn't stop the others
+    from being created.
+    """
+    items = await read_items(request)
+
+    return await bulk_create(
+        db,
+        models.TaskLog,
+        schemas.TaskLogCreate,
+        items,
+        logged_by=current_employee.employee_id
+    )
 
 
 @router.get(
     '/info/{id}',
     response_model=schemas.TaskLogComplete
 )
-def get_task_log(
+async def get_task_log(
     id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    conditional: Conditional = Depends(),
+    fields: Fieldset = Depends(SparseFields(schemas.TaskLogComplete)),
 ):
-    """ 
+    """
     {id} is a path parameter
     """
     # We are
@@ -88,50 +174,71 @@ def get_task_log(
     # error later. Don't know the reason for the error yet.
     # post = cursor.fetchone()
 
-    task_log = db.query(models.TaskLog).filter(
+    # Looked up and not found a moment ago, see missing.py
+    replica = reads_from_replica(request)
+    if is_missing(models.TaskLog, id, replica):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"TaskLog with id: {id} not found!"
+        )
+
+    not_modified = await conditional.check_row(
+        db, models.TaskLog, models.TaskLog.task_id == id
+    )
+    if not_modified:
+        return not_modified
+
+    task_log = await load_one(
+        db,
+        models.TaskLog,
+        fields.schema,
         models.TaskLog.task_id == id
-    ).first()
+    )
 
     if not task_log:
+        remember_missing(models.TaskLog, id, replica)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"TaskLog with id: {id} not found!"
         )
 
-    return task_log
+    return fields.respond(task_log, conditional.response)
 
 
 @router.delete(
     '/delete/{id}',
     status_code=status.HTTP_204_NO_CONTENT
 )
-def delete_task_log(
+async def delete_task_log(
     id: int,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: schemas.TokenData = Depends(oauth2.get_token_data)
 ):
 
-    task_log_query = db.query(
-        models.TaskLog
-    ).filter(
-        models.TaskLog.task_id == id
+    deleted = await delete_returning(
+        db,
+        models.TaskLog,
+        models.TaskLog.task_id == id,
+        models.TaskLog.logged_by == current_employee.employee_id
     )
-    task_log = task_log_query.first()
 
-    if task_log is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Task Log with id: {id} does not exist!"
-        )
+    if not deleted:
+        # Only a failed delete pays for this lookup, it tells
+        # a missing task log apart from someone else's task log
+        if await db.get(models.TaskLog, id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Task Log with id: {id} does not exist!"
+            )
 
-    if current_employee.employee_id != task_log.logged_by:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"Not Authorized to perform requested action!"
         )
 
-    task_log_query.delete(synchronize_session=False)
-    db.commit()
+    await db.commit()
+    await response_cache.bump(models.TaskLog)
+    remember_missing(models.TaskLog, id)
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -141,43 +248,43 @@ def delete_task_log(
     '/update/{id}',
     response_model=schemas.TaskLogUpdate
 )
-def update_task_log(
+async def update_task_log(
     id: int,
     updated_task_log: schemas.TaskLogCreate,
-    db: Session = Depends(get_db),
-    current_employee: int = Depends(oauth2.get_current_employee)
+    db: AsyncSession = Depends(get_db),
+    current_employee: schemas.TokenData = Depends(oauth2.get_token_data)
 ):
 
-    task_log_query = db.query(
-        models.TaskLog
-    ).filter(
-        models.TaskLog.task_id == id
-    )
+    # print(status_code.__dict__)
+    updated_init_type = updated_task_log.dict()
+    updated_init_type["updated_at"] = func.now()
 
-    task_log = task_log_query.first()
+    # print(updated_init_type)
+    task_log = await update_returning(
+        db,
+        models.TaskLog,
+        updated_init_type,
+        models.TaskLog.task_id == id,
+        models.TaskLog.logged_by == current_employee.employee_id,
+        schema=schemas.TaskLogUpdate
+    )
 
     if task_log is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Task log with id: {id} does not exist!"
-        )
+        # Only a failed update pays for this lookup, it tells
+        # a missing task log apart from someone else's task log
+        if await db.get(models.TaskLog, id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Task log with id: {id} does not exist!"
+            )
 
-    if current_employee.employee_id != task_log.logged_by:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"Not Authorized to perform requested action!"
         )
 
-    # print(status_code.__dict__)
-    updated_init_type = updated_task_log.dict()
-    updated_init_type["updated_at"] = datetime.now().astimezone()
-
-    # print(updated_init_type)
-    task_log_query.update(
-        updated_init_type,
-        synchronize_session=False
-    )
-    db.commit()
+    await db.commit()
+    await response_cache.bump(models.TaskLog)
 
     # Sending the updated empl_type back to the user
-    return task_log_query.first()
+    return task_log
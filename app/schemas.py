@@ -8,7 +8,7 @@
 """
 
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, EmailStr
 
 
@@ -71,10 +71,99 @@ class EmployeeShort(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class RevokeRequest(BaseModel):
+    # An access or a refresh token
+    token: str
 
 
 class TokenData(BaseModel):
-    employee_id: Optional[str] = None
+    employee_id: Optional[int] = None
+    # "refresh" for refresh tokens, not set on access tokens
+    type: Optional[str] = None
+    jti: Optional[str] = None
+    exp: Optional[int] = None
+    employee_type_id: Optional[int] = None
+    employee_name: Optional[str] = None
+    permissions_version: Optional[int] = None
+
+    class Config:
+        # Shared between requests through the token cache
+        allow_mutation = False
+
+
+class Principal(BaseModel):
+    """
+    The authenticated employee, as handed to the endpoints.
+
+    It is shared between requests through the principal cache,
+    hence immutable.
+    """
+    employee_id: int
+    email: EmailStr
+    employee_name: str
+    employee_type_id: int
+    employee_type: EmployeeTypeCreate
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+        allow_mutation = False
+
+
+class PoolStats(BaseModel):
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    max_overflow: int
+    checkouts: int
+    timeouts: int
+    wait_seconds_total: float
+    wait_seconds_max: float
+
+
+class CacheStats(BaseModel):
+    # None when the entries are not kept by this worker
+    size: Optional[int]
+    # None when the whole table is cached
+    maxsize: Optional[int]
+    ttl_seconds: float
+    hits: int
+    misses: int
+    # Bumped by every invalidation, for the reference tables
+    version: Optional[int] = None
+    # For the caches bounded by the size of their entries
+    evictions: Optional[int] = None
+    bytes: Optional[int] = None
+    max_bytes: Optional[int] = None
+
+
+class CoalescingStats(BaseModel):
+    in_flight: int
+    executions: int
+    coalesced: int
+    # Share of the requests that waited for another one's result
+    ratio: float
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    status_code: int
+    id: Optional[int] = None
+    detail: Optional[Any] = None
+
+
+class BulkResult(BaseModel):
+    created: int
+    failed: int
+    items: List[BulkItemResult]
 
 # ----------------------------------------------
 
@@ -343,3 +432,17 @@ class RatingComplete(RatingUpdate):
 
     class Config:
         orm_mode = True
+
+
+class RatingSummary(BaseModel):
+    initiative_id: int
+    rating_count: int
+    point_sum: int
+    point_min: Optional[int]
+    point_max: Optional[int]
+    point_avg: Optional[float]
+    # point -> number of ratings with that point
+    histogram: Dict[int, int]
+
+    class Config:
+        orm_mode = True
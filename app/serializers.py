@@ -0,0 +1,253 @@
+# Fast path for the JSON responses of the list endpoints.
+#
+# By default FastAPI turns every ORM object into a pydantic model (with full
+# validation of every field), runs the models through jsonable_encoder and
+# only then through json.dumps. The rows come from our own database and
+# already fit the schema, so here a function is built once per schema that
+# reads the attributes the schema needs straight into plain dicts, and
+# those are encoded with orjson. The bytes are the same as the ones of the
+# default path.
+#
+# Off unless FAST_JSON_RESPONSES is set.
+
+import json
+from datetime import datetime
+from functools import lru_cache, partial
+from typing import Any
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseConfig, BaseModel, EmailStr, ValidationError
+from pydantic.fields import (
+    SHAPE_DICT, SHAPE_LIST, SHAPE_MAPPING, SHAPE_SEQUENCE, SHAPE_SINGLETON,
+    ModelField
+)
+
+from .config import settings
+
+# Installed with fastapi[all]
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _email(value: str) -> str:
+    # What EmailStr does to an address that is already valid, without
+    # running the whole validator again
+    value = value.strip()
+    at = value.index("@")
+    return value[:at] + value[at:].lower()
+
+
+def _validated(field: ModelField):
+    """
+    Fallback for the types that have no shortcut below: the one field is
+    validated by pydantic and encoded like FastAPI would.
+    """
+    def convert(value):
+        value, errors = field.validate(value, {}, loc=field.name)
+        if errors:
+            raise ValidationError([errors], BaseModel)
+        return jsonable_encoder(value)
+
+    return convert
+
+
+def _scalar(type_):
+    """
+    Returns (convert, exact) for a single value of `type_`, or None
+    when the type has no shortcut.
+
+    `convert` is None for values that are used as they are. `exact` tells
+    whether orjson encodes the converted values the same way as json.dumps.
+    It does not for floats: 1e-05 comes out as 0.00001 for example.
+    """
+    if type_ is Any:
+        return jsonable_encoder, False
+    if type_ in (int, str, bool):
+        return None, True
+    if type_ is float:
+        return float, False
+    if type_ is datetime:
+        return datetime.isoformat, True
+    if type_ is EmailStr:
+        return _email, True
+    if isinstance(type_, type) and issubclass(type_, BaseModel):
+        return _model(type_)
+
+    return None
+
+
+def _field(field: ModelField):
+    """
+    Returns (convert, exact) for the values of a pydantic field
+    """
+    if field.shape == SHAPE_SINGLETON:
+        compiled = _scalar(field.type_)
+
+    elif field.shape in (SHAPE_LIST, SHAPE_SEQUENCE):
+        item, exact = _field(field.sub_fields[0])
+        compiled = (
+            list if item is None else
+            lambda values: [item(value) for value in values]
+        ), exact
+
+    elif field.shape in (SHAPE_DICT, SHAPE_MAPPING) and \
+            field.key_field.type_ in (int, str):
+        # json.dumps writes int keys as strings, orjson refuses them
+        key = str if field.key_field.type_ is str \
+            else lambda key: str(int(key))
+        item, exact = _field(field.sub_fields[0])
+        compiled = (
+            lambda values: {
+                key(k): v if item is None else item(v)
+                for k, v in values.items()
+            }
+        ), exact
+
+    else:
+        compiled = None
+
+    if compiled is None:
+        return _validated(field), False
+
+    convert, exact = compiled
+    if convert is not None and field.allow_none:
+        return (
+            lambda value: None if value is None else convert(value)
+        ), exact
+
+    return convert, exact
+
+
+@lru_cache(maxsize=None)
+def _model(schema):
+    """
+    Returns (convert, exact) where `convert` turns an ORM object, a row
+    or a dict into the dict `schema` would be encoded as
+    """
+    fields = []
+    exact = True
+
+    for field in schema.__fields__.values():
+        convert, field_exact = _field(field)
+        fields.append((field.alias, field.default, convert))
+        exact = exact and field_exact
+
+    def convert(obj):
+        # The same lookups as orm_mode (attributes) or as
+        # parse_obj (keys), defaults included
+        get = obj.get if isinstance(obj, dict) else partial(getattr, obj)
+
+        return {
+            alias: get(alias, default) if convert is None
+            else convert(get(alias, default))
+            for alias, default, convert in fields
+        }
+
+    return convert, exact
+
+
+def _dumps(content) -> bytes:
+    # What JSONResponse.render() does
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class Serializer:
+    """
+    Encodes content as `type_` (a schema, or List[schema], as in the
+    `response_model` of an endpoint), dumps() without validating it.
+    """
+
+    def __init__(self, type_):
+        self.field = ModelField.infer(
+            name="response",
+            value=...,
+            annotation=type_,
+            class_validators=None,
+            config=BaseConfig
+        )
+        self.to_python, exact = _field(self.field)
+        if self.to_python is None:
+            self.to_python = _validated(self.field)
+        self.use_orjson = orjson is not None and exact
+
+    def dumps(self, content) -> bytes:
+        """
+        Same bytes as a JSONResponse of the validated content
+        """
+        content = self.to_python(content)
+
+        if self.use_orjson:
+            return orjson.dumps(content)
+
+        return _dumps(content)
+
+    def dumps_validated(self, content) -> bytes:
+        """
+        The regular path of FastAPI: validation, jsonable_encoder
+        and JSONResponse
+        """
+        value, errors = self.field.validate(content, {}, loc=("response",))
+        if errors:
+            raise ValidationError([errors], self.field.type_)
+
+        return _dumps(jsonable_encoder(value))
+
+    def line(self, content) -> str:
+        """
+        Same text as BaseModel.json(), for the NDJSON exports
+        """
+        return json.dumps(self.to_python(content))
+
+
+@lru_cache(maxsize=None)
+def serializer_for(type_) -> Serializer:
+    return Serializer(type_)
+
+
+def json_response(type_, content, response: Response = None) -> Response:
+    """
+    Encodes `content` as `type_` into a response, through the fast path
+    when FAST_JSON_RESPONSES is on. For the endpoints that return
+    something other than their `response_model`.
+
+    `response` is the Response an endpoint or a dependency set headers
+    on, those are carried over.
+    """
+    serializer = serializer_for(type_)
+
+    encoded = Response(
+        content=serializer.dumps(content) if settings.fast_json_responses
+        else serializer.dumps_validated(content),
+        media_type="application/json"
+    )
+
+    if response is not None:
+        encoded.headers.raw.extend(
+            (name, value) for name, value in response.headers.raw
+            if name != b"content-length"
+        )
+        if response.status_code:
+            encoded.status_code = response.status_code
+
+    return encoded
+
+
+def fast_json(type_, content, response: Response = None):
+    """
+    Returns `content` as a ready made JSON response of `type_` when
+    FAST_JSON_RESPONSES is on, and as it is (for FastAPI to validate
+    and encode) otherwise.
+    """
+    if not settings.fast_json_responses:
+        return content
+
+    return json_response(type_, content, response)
@@ -0,0 +1,125 @@
+# Coalescing of identical reads that are in flight at the same time.
+#
+# When many clients ask for the same hot resource at once, the first
+# request runs the queries and the ones that arrive while it is still
+# running wait for it and share its result, instead of all of them
+# queueing up for a connection of the pool and running the same queries.
+# https://pkg.go.dev/golang.org/x/sync/singleflight
+#
+# The result is shared by the requests of this worker only, and only for
+# as long as it is being worked out: nothing is kept afterwards.
+
+import asyncio
+
+from fastapi import Request, Response
+
+from .config import settings
+from .database import reads_from_replica
+
+
+class SingleFlight:
+    def __init__(self):
+        # key -> future of the running computation
+        self._flights = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, compute):
+        """
+        Awaits compute() and returns its result (or raises its exception),
+        unless one is already running for `key`: then that one's.
+        """
+        while key in self._flights:
+            flight = self._flights[key]
+            self.coalesced += 1
+
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                # The request running it went away, another one takes over
+                if flight.cancelled():
+                    self.coalesced -= 1
+                    continue
+                raise
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        self.executions += 1
+
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            # Only the waiting requests care, no "never retrieved" warning
+            flight.exception()
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            del self._flights[key]
+
+    def stats(self):
+        requests = self.executions + self.coalesced
+
+        return {
+            "in_flight": len(self._flights),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "ratio": self.coalesced / requests if requests else 0.0,
+        }
+
+
+flights = SingleFlight()
+
+
+class Coalesced:
+    """
+    Dependency that shares the work of an endpoint between identical
+    requests (same path and query, reading from the same database) in
+    flight at the same time.
+
+    The steps have to give the same result to every request, whoever is
+    asking: the permission checks come before them.
+
+    Usage:
+        updated_at = await coalesced.run(
+            "version",
+            lambda: row_version(db, model, *criteria)
+        )
+        ...
+        return await coalesced.respond(("body", updated_at), load)
+    """
+
+    def __init__(self, request: Request):
+        self.request = request
+
+    async def run(self, step, compute):
+        """
+        compute() once for the identical requests, `step` tells apart the
+        steps of the same endpoint
+        """
+        if not settings.coalesce_reads:
+            return await compute()
+
+        # The same parameters in another order are the same request
+        query = sorted(self.request.query_params.multi_items())
+        # A request pinned to the primary after a write must not be
+        # handed what a request reading from a replica found
+        replica = reads_from_replica(self.request)
+
+        return await flights.do(
+            (self.request.url.path, tuple(query), replica, step),
+            compute
+        )
+
+    async def respond(self, step, compute) -> Response:
+        """
+        run() for a compute() that returns the body of the response as a
+        Precompressed, every request gets its own response out of it
+        """
+        entry = await self.run(step, compute)
+        return entry.response(self.request.headers.get("accept-encoding"))
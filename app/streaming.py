@@ -0,0 +1,54 @@
+# Streaming export of the big list endpoints as NDJSON
+# (one JSON document per line, http://ndjson.org/).
+#
+# A normal list response keeps the ORM objects, the pydantic models and the
+# whole JSON body in memory at once. Here rows are pulled from a server side
+# cursor in batches and every row is serialized and sent on its own.
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from . import reference
+from .config import settings
+from .database import reads_from_replica, session_scope
+from .serializers import serializer_for
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Number of rows fetched from the server side cursor at a time
+STREAM_BATCH_SIZE = 1000
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_response(request: Request, statement, schema):
+    """
+    Streams every row of the statement serialized as `schema`.
+
+    The rows are read through a session of their own, because the
+    response body is still being produced after the endpoint returns.
+    It goes where get_db would have sent the request: to a replica when
+    there is one, unless the client is pinned to the primary.
+    """
+    replica = reads_from_replica(request)
+
+    if settings.fast_json_responses:
+        dumps = serializer_for(schema).line
+    else:
+        def dumps(row):
+            return schema.from_orm(row).json()
+
+    async def lines():
+        async with session_scope(replica=replica) as db:
+            result = await db.stream_scalars(
+                statement.execution_options(stream_results=True)
+            )
+
+            async for rows in result.partitions(STREAM_BATCH_SIZE):
+                await reference.attach(rows)
+                for row in rows:
+                    yield dumps(row) + "\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,204 @@
+# Throttling of the login attempts.
+#
+# Every attempt takes a token from two buckets, one for the username and
+# one for the client's IP address. A bucket holds up to `burst` tokens
+# and gets `per_minute` of them back every minute. When either bucket is
+# empty the attempt is turned down before the database or bcrypt get to
+# see it.
+# https://en.wikipedia.org/wiki/Token_bucket
+#
+# The buckets live in the worker's memory, or in Redis when
+# LOGIN_THROTTLE_REDIS_URL is set, so that all workers share them.
+#
+# Behind a proxy every request comes from the proxy's address, and all
+# the clients would share one bucket. Each of the LOGIN_TRUSTED_PROXY_HOPS
+# proxies appends the address it got the request from to X-Forwarded-For,
+# so the client is the one that many entries from the end: the entries
+# before it are whatever the client sent and are never trusted. The
+# Procfile sets it to 1 for the Heroku router. Without proxies in front
+# of the app it has to stay 0, or clients could pick their own address.
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, Request, status
+
+from .config import settings
+
+# Buckets kept in memory, the least recently used one goes first
+MAX_TRACKED_BUCKETS = 100000
+
+
+class Limit(NamedTuple):
+    burst: int
+    per_minute: float
+
+    @property
+    def per_second(self):
+        return self.per_minute / 60
+
+
+class MemoryBuckets:
+    def __init__(self, maxsize=MAX_TRACKED_BUCKETS):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        # key -> (tokens, time of the last update)
+        self._buckets = OrderedDict()
+
+    async def take(self, limits):
+        """
+        Takes a token from every bucket of `limits` ({key: Limit}), or
+        from none of them when one is empty.
+
+        Returns 0, or the seconds until the attempt would be allowed.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            tokens = {}
+            for key, limit in limits.items():
+                left, updated = self._buckets.get(key, (limit.burst, now))
+                tokens[key] = min(
+                    limit.burst,
+                    left + (now - updated) * limit.per_second
+                )
+
+            wait = max(
+                (
+                    (1 - tokens[key]) / limit.per_second
+                    for key, limit in limits.items() if tokens[key] < 1
+                ),
+                default=0
+            )
+
+            for key in limits:
+                if not wait:
+                    tokens[key] -= 1
+                self._buckets[key] = (tokens[key], now)
+                self._buckets.move_to_end(key)
+
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+
+        return wait
+
+
+# Same as MemoryBuckets.take(), in one atomic step on the Redis server.
+# KEYS are the buckets, ARGV holds burst and tokens per second for each.
+_TAKE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tokens = {}
+local wait = 0
+
+for i, key in ipairs(KEYS) do
+    local burst = tonumber(ARGV[2 * i - 1])
+    local rate = tonumber(ARGV[2 * i])
+    local bucket = redis.call('HMGET', key, 'tokens', 'updated')
+    local left = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens[i] = math.min(burst, left + (now - updated) * rate)
+    if tokens[i] < 1 then
+        wait = math.max(wait, (1 - tokens[i]) / rate)
+    end
+end
+
+for i, key in ipairs(KEYS) do
+    local burst = tonumber(ARGV[2 * i - 1])
+    local rate = tonumber(ARGV[2 * i])
+    if wait == 0 then
+        tokens[i] = tokens[i] - 1
+    end
+    redis.call('HSET', key, 'tokens', tokens[i], 'updated', now)
+    redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    def __init__(self, url):
+        # Only needed for this backend, hence not in requirements.txt
+        try:
+            import redis.asyncio
+        except ImportError:
+            raise RuntimeError(
+                "LOGIN_THROTTLE_REDIS_URL needs the redis package"
+            )
+
+        self._redis = redis.asyncio.from_url(url)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+
+    async def take(self, limits):
+        args = []
+        for limit in limits.values():
+            args += [limit.burst, limit.per_second]
+
+        return float(await self._take(keys=list(limits), args=args))
+
+
+if settings.login_throttle_redis_url:
+    buckets = RedisBuckets(settings.login_throttle_redis_url)
+else:
+    buckets = MemoryBuckets()
+
+
+def client_address(request: Request) -> Optional[str]:
+    """
+    The address of the client, past the trusted proxies
+    """
+    hops = settings.login_trusted_proxy_hops
+
+    if hops > 0:
+        forwarded = [
+            address.strip()
+            for header in request.headers.getlist("x-forwarded-for")
+            for address in header.split(",")
+            if address.strip()
+        ]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+
+    return request.client.host if request.client else None
+
+
+def _login_limits(request: Request, username: str):
+    limits = {}
+
+    username_limit = Limit(
+        settings.login_username_burst,
+        settings.login_username_per_minute
+    )
+    if username_limit.burst > 0 and username_limit.per_minute > 0:
+        key = f"login:username:{username.strip().lower()}"
+        limits[key] = username_limit
+
+    ip_limit = Limit(settings.login_ip_burst, settings.login_ip_per_minute)
+    address = client_address(request)
+    if address and ip_limit.burst > 0 and ip_limit.per_minute > 0:
+        limits[f"login:ip:{address}"] = ip_limit
+
+    return limits
+
+
+async def throttle_login(request: Request, username: str):
+    """
+    Raises 429 (with Retry-After) once the username or the client's
+    address has used up its login attempts
+    """
+    limits = _login_limits(request, username)
+    if not limits:
+        return
+
+    wait = await buckets.take(limits)
+
+    if wait:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many login attempts, try again later!",
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
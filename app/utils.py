@@ -1,8 +1,20 @@
 # This file will hold a bunch of utility functions
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt is made to be slow. Running it in the threadpool lets a burst of
+# logins take every thread and stall all other endpoints, so it gets
+# processes of its own. Created on first use, see _password_pool().
+_pool = None
+
 
 def hash(password: str):
     """
@@ -16,3 +28,51 @@ def hash(password: str):
 
 def verify(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
+
+
+def _password_pool():
+    global _pool
+
+    if _pool is None:
+        # spawn rather than fork, forking a process that is running
+        # threads can leave the children with locks nobody will release
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.password_hash_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    return _pool
+
+
+async def _run_password_function(function, *args):
+    if settings.password_hash_workers <= 0:
+        return await run_in_threadpool(function, *args)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_pool(), function, *args)
+
+
+async def hash_async(password: str):
+    """
+    hash() in the password process pool
+    """
+    return await _run_password_function(hash, password)
+
+
+async def verify_async(plain_password, hashed_password):
+    """
+    verify() in the password process pool
+    """
+    return await _run_password_function(
+        verify,
+        plain_password,
+        hashed_password
+    )
+
+
+def shutdown_password_pool():
+    global _pool
+
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
@@ -0,0 +1,107 @@
+# A burst of logins: bcrypt in the threadpool against bcrypt in the
+# password process pool (see utils.hash_async and utils.verify_async).
+#
+# While the logins are being checked, a probe keeps running a no-op in the
+# threadpool every few milliseconds, the way the sync parts of the other
+# endpoints do. Its latency is what the rest of the API feels during the
+# storm.
+#
+# Run from the root of the repository, no database needed:
+#     python -m benchmarks.login_storm --logins 200 --workers 4
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+# The settings the app can't start without
+for name, value in {
+    "DATABASE_HOSTNAME": "localhost",
+    "DATABASE_PORT": "5432",
+    "DATABASE_USERNAME": "postgres",
+    "DATABASE_PASSWORD": "postgres",
+    "DATABASE_NAME": "task_api",
+    "SECRET_KEY": "benchmark",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+}.items():
+    os.environ.setdefault(name, value)
+
+from starlette.concurrency import run_in_threadpool  # noqa: E402
+
+from app import utils  # noqa: E402
+from app.config import settings  # noqa: E402
+
+PROBE_INTERVAL_SECONDS = 0.005
+
+
+async def probe(latencies: list, done: asyncio.Event):
+    while not done.is_set():
+        started = time.perf_counter()
+        await run_in_threadpool(lambda: None)
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(PROBE_INTERVAL_SECONDS)
+
+
+async def storm(logins: int, hashed: str) -> dict:
+    # The processes are started before the clock, not by the first login
+    await utils.verify_async("password", hashed)
+
+    latencies = []
+    done = asyncio.Event()
+    prober = asyncio.create_task(probe(latencies, done))
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[
+        utils.verify_async("password", hashed) for _ in range(logins)
+    ])
+    elapsed = time.perf_counter() - started
+
+    done.set()
+    await prober
+    assert all(results)
+
+    latencies.sort()
+    return {
+        "seconds": elapsed,
+        "logins_per_second": logins / elapsed,
+        "probe_p50_ms": statistics.median(latencies) * 1000,
+        "probe_p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "probe_max_ms": latencies[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument(
+        "--workers", type=int, default=settings.password_hash_workers,
+        help="processes of the password pool"
+    )
+    args = parser.parse_args()
+
+    hashed = utils.hash("password")
+
+    for label, workers in [
+        ("threadpool", 0),
+        (f"{args.workers} processes", args.workers),
+    ]:
+        settings.password_hash_workers = workers
+        try:
+            result = asyncio.run(storm(args.logins, hashed))
+        finally:
+            utils.shutdown_password_pool()
+
+        print(
+            f"{label:>14}: {args.logins} logins in "
+            f"{result['seconds']:.2f}s "
+            f"({result['logins_per_second']:.1f}/s), threadpool probe "
+            f"p50 {result['probe_p50_ms']:.1f}ms "
+            f"p99 {result['probe_p99_ms']:.1f}ms "
+            f"max {result['probe_max_ms']:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# get_token_data with and without the cache of the verified tokens (see
+# oauth2.verify_access_token): checking the signature and parsing the
+# claims on every request, or once per token.
+#
+# The revocation filter is loaded empty, the way it is when no token has
+# been revoked, so no database is needed.
+#
+# Run from the root of the repository:
+#     python -m benchmarks.token_decode --requests 100000 --tokens 100
+
+import argparse
+import asyncio
+import os
+import time
+
+# The settings the app can't start without
+for name, value in {
+    "DATABASE_HOSTNAME": "localhost",
+    "DATABASE_PORT": "5432",
+    "DATABASE_USERNAME": "postgres",
+    "DATABASE_PASSWORD": "postgres",
+    "DATABASE_NAME": "task_api",
+    "SECRET_KEY": "benchmark",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+}.items():
+    os.environ.setdefault(name, value)
+
+from app import oauth2  # noqa: E402
+from app.bloom import BloomFilter  # noqa: E402
+from app.cache import TTLCache  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.revocation import revocations  # noqa: E402
+
+
+async def decode(tokens: list, requests: int) -> float:
+    """
+    Seconds per get_token_data() call, `requests` of them spread over
+    the `tokens` of as many clients
+    """
+    started = time.perf_counter()
+
+    for i in range(requests):
+        await oauth2.get_token_data(tokens[i % len(tokens)], db=None)
+
+    return (time.perf_counter() - started) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument(
+        "--tokens", type=int, default=100,
+        help="distinct clients sending their token over and over"
+    )
+    args = parser.parse_args()
+
+    revocations._filter = BloomFilter(settings.revocation_filter_capacity)
+    tokens = [
+        oauth2.create_access_token({
+            "employee_id": id,
+            "employee_type_id": 4,
+            "employee_name": f"employee {id}",
+            "permissions_version": 0,
+        })
+        for id in range(args.tokens)
+    ]
+
+    results = {}
+    for label, cache in [
+        ("uncached", TTLCache(0, 0)),
+        ("cached", TTLCache(
+            settings.token_cache_size,
+            settings.token_cache_ttl_seconds
+        )),
+    ]:
+        oauth2.token_cache = cache
+        results[label] = asyncio.run(decode(tokens, args.requests))
+
+        print(
+            f"{label:>8}: {results[label] * 1e6:.1f}us per request, "
+            f"{1 / results[label]:,.0f} requests/s"
+        )
+
+    print(f"speedup: {results['uncached'] / results['cached']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# Shared setup of the tests.
+#
+# Most tests exercise one module on its own and need no database. The
+# ones that go through the endpoints use the `client` fixture, which runs
+# against the database of the DATABASE_* settings and only when
+# TEST_DATABASE=1: it empties every table first, so point it at a scratch
+# database migrated with `alembic upgrade head`.
+
+import os
+
+import pytest
+from sqlalchemy import event, text
+
+# The settings the app can't start without, for the tests that don't
+# touch the database
+for name, value in {
+    "DATABASE_HOSTNAME": "localhost",
+    "DATABASE_PORT": "5432",
+    "DATABASE_USERNAME": "postgres",
+    "DATABASE_PASSWORD": "postgres",
+    "DATABASE_NAME": "task_api_test",
+    "SECRET_KEY": "test",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def database():
+    if os.environ.get("TEST_DATABASE") != "1":
+        pytest.skip("needs TEST_DATABASE=1 and a scratch database")
+
+    from app import database, models
+
+    tables = ", ".join(
+        table.name for table in models.Base.metadata.sorted_tables
+    )
+    with database.engine.begin() as connection:
+        connection.execute(
+            text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE")
+        )
+
+    return database
+
+
+@pytest.fixture
+def client(database):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+        # The connections of the async engine belong to the event loop of
+        # this client, the next one opens its own
+        if database.async_engine is not None:
+            client.portal.call(database.async_engine.dispose)
+
+
+@pytest.fixture
+def queries(database):
+    """
+    Counts the statements sent to the database, in queries[0]
+    """
+    count = [0]
+
+    def executed(*args):
+        count[0] += 1
+
+    engines = [database.engine]
+    if database.async_engine is not None:
+        engines.append(database.async_engine.sync_engine)
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", executed)
+    yield count
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", executed)
+
+
+@pytest.fixture
+def seed(database):
+    """
+    seed(start, rows) adds `rows` of every table from id `start` on,
+    each one with its own creator, initiative and types
+    """
+    from app import models
+
+    def add_rows(start: int, rows: int):
+        db = database.SessionLocal()
+
+        if start == 1:
+            db.add(models.EmployeeType(employee_type_id=1, role_name="admin"))
+            db.flush()
+
+        for id in range(start, start + rows):
+            db.add(models.Employee(
+                employee_id=id, employee_name=f"employee {id}",
+                email=f"employee{id}@example.com", password="-",
+                employee_type_id=1
+            ))
+            db.flush()
+            db.add_all([
+                models.InitiativeType(
+                    initiative_type_id=id, name=f"type {id}",
+                    description="-", created_by=id, updated_by=id
+                ),
+                models.StatusCode(
+                    status_id=id, description=f"status {id}",
+                    created_by=id, updated_by=id
+                ),
+            ])
+            db.flush()
+            db.add(models.Initiative(
+                initiative_id=id, title=f"initiative {id}",
+                description="-", initiative_type=id, status_id=id,
+                created_by=id, updated_by=id
+            ))
+            db.flush()
+            db.add_all([
+                models.TaskLog(
+                    initiative_id=id, description="-", logged_by=id
+                ),
+                models.Rating(initiative_id=id, point=id % 5, given_by=id),
+            ])
+
+        db.commit()
+        db.close()
+
+    return add_rows
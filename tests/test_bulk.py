@@ -0,0 +1,40 @@
+from sqlalchemy import select
+
+from app import models, oauth2
+
+
+def test_every_item_gets_its_own_id(database, seed, client):
+    seed(1, 3)
+    headers = {
+        "Authorization": "Bearer " + oauth2.create_access_token(
+            {"employee_id": 2}
+        )
+    }
+    items = [
+        {"initiative_id": index % 3 + 1, "description": f"item {index}"}
+        if index % 7 else {"initiative_id": 99, "description": "missing"}
+        for index in range(300)
+    ]
+
+    response = client.post("/review/bulk", json=items, headers=headers)
+
+    assert response.status_code == 200
+    results = response.json()["items"]
+    assert len(results) == 300
+
+    db = database.SessionLocal()
+    reviews = dict(db.execute(
+        select(models.Review.review_id, models.Review.description)
+    ).all())
+    db.close()
+
+    for index, result in enumerate(results):
+        assert result["index"] == index
+        if index % 7:
+            assert result["status_code"] == 201
+            assert reviews[result["id"]] == f"item {index}"
+        else:
+            assert result["status_code"] == 404
+            assert result["id"] is None
+
+    assert len(reviews) == response.json()["created"]
@@ -0,0 +1,137 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.compression import ENCODINGS, CompressionMiddleware, \
+    Precompressed, accepted_encoding
+from app.config import settings
+
+BIG = b'{"creator":{"employee_name":"someone"}}' * 100
+
+
+@pytest.mark.parametrize("accept_encoding, encoding", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("deflate, gzip;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("*", ENCODINGS[0]),
+])
+def test_accepted_encoding(accept_encoding, encoding):
+    assert accepted_encoding(accept_encoding) == encoding
+
+
+def test_compression_off(monkeypatch):
+    monkeypatch.setattr(settings, "compression_level", 0)
+
+    assert accepted_encoding("gzip") is None
+
+
+def test_precompressed_response():
+    entry = Precompressed(BIG, headers={"etag": 'W/"1"'})
+
+    plain = entry.response(None)
+    assert plain.body == BIG
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["etag"] == 'W/"1"'
+    assert plain.headers["vary"] == "Accept-Encoding"
+
+    compressed = entry.response("gzip")
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(compressed.body) == BIG
+    # Compressed once, for the first request
+    assert entry.response("gzip").body is compressed.body
+
+
+def test_small_bodies_are_not_compressed():
+    entry = Precompressed(b"[]")
+
+    assert "content-encoding" not in entry.response("gzip").headers
+    assert entry.precompress() == {}
+    assert entry.size == 2
+
+
+def test_precompress():
+    entry = Precompressed(BIG)
+
+    encoded = entry.precompress()
+
+    assert "gzip" in encoded
+    assert entry.size == len(BIG) + sum(map(len, encoded.values()))
+
+
+def test_from_response():
+    entry = Precompressed.from_response(
+        JSONResponse([1, 2], headers={"X-Next-Cursor": "abc"})
+    )
+
+    assert entry.body == b"[1,2]"
+    assert entry.media_type == "application/json"
+    assert entry.headers == {"x-next-cursor": "abc"}
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/big")
+    def big():
+        return JSONResponse(BIG.decode())
+
+    @app.get("/small")
+    def small():
+        return JSONResponse([])
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(
+            iter([BIG, BIG]), media_type="application/x-ndjson"
+        )
+
+    @app.get("/encoded")
+    def encoded():
+        entry = Precompressed(BIG)
+        return entry.response("gzip")
+
+    return TestClient(app)
+
+
+def test_middleware_compresses(client):
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in response.headers["vary"].lower()
+    assert response.json() == BIG.decode()
+
+
+def test_middleware_without_accept_encoding(client):
+    response = client.get("/big", headers={"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in response.headers
+    assert response.json() == BIG.decode()
+
+
+def test_middleware_skips_small_bodies(client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert response.json() == []
+
+
+def test_middleware_compresses_streams(client):
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == BIG * 2
+
+
+def test_middleware_leaves_encoded_bodies_alone(client):
+    response = client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == BIG
@@ -0,0 +1,101 @@
+from datetime import datetime
+
+import pytest
+from fastapi import Request, Response
+
+from app import models
+from app.conditional import Conditional, not_modified, weak_etag
+
+
+def request(path="/rating/all", query="", if_none_match=None) -> Request:
+    headers = []
+    if if_none_match is not None:
+        headers.append((b"if-none-match", if_none_match.encode()))
+
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query.encode(),
+        "headers": headers,
+    })
+
+
+def test_weak_etag():
+    tag = weak_etag(3, 7, datetime(2022, 1, 1))
+
+    assert tag.startswith('W/"') and tag.endswith('"')
+    assert tag == weak_etag(3, 7, datetime(2022, 1, 1))
+    assert tag != weak_etag(3, 8, datetime(2022, 1, 1))
+
+
+def test_no_if_none_match():
+    assert not_modified(request(), weak_etag(1)) is None
+
+
+@pytest.mark.parametrize("if_none_match", [
+    '{tag}',
+    '{opaque}',
+    '"other", {tag}',
+    '*',
+])
+def test_matching_if_none_match(if_none_match):
+    tag = weak_etag(1)
+    header = if_none_match.format(tag=tag, opaque=tag[2:])
+
+    response = not_modified(request(if_none_match=header), tag)
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == tag
+    assert response.body == b""
+
+
+def test_other_if_none_match():
+    assert not_modified(
+        request(if_none_match=weak_etag(2)), weak_etag(1)
+    ) is None
+
+
+def test_check_sets_the_etag():
+    response = Response()
+    conditional = Conditional(request(), response)
+
+    assert conditional.check(3, 7) is None
+    tag = response.headers["etag"]
+
+    again = Conditional(request(if_none_match=tag), Response())
+    assert again.check(3, 7).status_code == 304
+    assert Conditional(request(if_none_match=tag), Response()).check(
+        3, 8
+    ) is None
+
+
+def test_check_depends_on_the_representation():
+    response = Response()
+    Conditional(request(), response).check(3, 7)
+    tag = response.headers["etag"]
+
+    other = Conditional(
+        request(query="fields=rating_id", if_none_match=tag), Response()
+    )
+    assert other.check(3, 7) is None
+
+
+class Row:
+    def __init__(self, rating_id, updated_at):
+        self.rating_id = rating_id
+        self.updated_at = updated_at
+
+
+def test_check_rows():
+    rows = [
+        Row(1, datetime(2022, 1, 2)),
+        Row(2, datetime(2022, 1, 1)),
+    ]
+    response = Response()
+
+    Conditional(request(), response).check_rows(rows, models.Rating.rating_id)
+
+    assert response.headers["etag"] == weak_etag(
+        "/rating/all", "", 2, 2, datetime(2022, 1, 2)
+    )
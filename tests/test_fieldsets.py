@@ -0,0 +1,53 @@
+import pytest
+from fastapi import HTTPException
+
+from app import schemas
+from app.fieldsets import SparseFields
+from app.routers.employee import employee_fields
+
+
+def test_without_fields():
+    fieldset = SparseFields(schemas.TaskLogSimple)(fields=None)
+
+    assert fieldset.schema is schemas.TaskLogSimple
+    assert not fieldset.sparse
+
+
+def test_trimmed_schema():
+    fieldset = SparseFields(schemas.TaskLogSimple)(
+        fields=" description,task_id ,"
+    )
+
+    assert fieldset.sparse
+    assert list(fieldset.schema.__fields__) == ["task_id", "description"]
+    # The same fields in another order are the same schema
+    assert SparseFields(schemas.TaskLogSimple)(
+        fields="task_id,description"
+    ).schema is fieldset.schema
+
+
+def test_unknown_field():
+    with pytest.raises(HTTPException) as error:
+        SparseFields(schemas.TaskLogSimple)(fields="task_id,password")
+
+    assert error.value.status_code == 400
+    assert "password" in error.value.detail
+
+
+def test_whitelist():
+    fields = SparseFields(schemas.TaskLogSimple, allowed=("task_id",))
+
+    assert list(fields(fields="task_id").schema.__fields__) == ["task_id"]
+    with pytest.raises(HTTPException):
+        fields(fields="description")
+
+
+def test_employee_emails_only_come_with_the_whole_record():
+    with pytest.raises(HTTPException) as error:
+        employee_fields(fields="email")
+
+    assert error.value.status_code == 400
+    assert "email" in employee_fields(fields=None).schema.__fields__
+    assert list(employee_fields(
+        fields="employee_id,employee_name"
+    ).schema.__fields__) == ["employee_id", "employee_name"]
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from app import database, missing, models
+from app.cache import TTLCache
+from app.database import PRIMARY_PIN_HEADER
+
+
+@pytest.fixture(autouse=True)
+def missing_ids(monkeypatch):
+    cache = TTLCache(100, 0.05)
+    monkeypatch.setattr(missing, "missing_ids", cache)
+    return cache
+
+
+def test_remembered_until_the_ttl():
+    missing.remember_missing(models.TaskLog, 7)
+
+    assert missing.is_missing(models.TaskLog, 7)
+    assert not missing.is_missing(models.TaskLog, 8)
+
+    time.sleep(0.06)
+    assert not missing.is_missing(models.TaskLog, 7)
+
+
+def test_by_table():
+    missing.remember_missing(models.TaskLog, 7)
+
+    assert not missing.is_missing(models.Rating, 7)
+
+
+def test_forget_missing():
+    missing.remember_missing(models.TaskLog, 7)
+    missing.remember_missing(models.TaskLog, 8)
+
+    missing.forget_missing(models.TaskLog, 7, 9)
+
+    assert not missing.is_missing(models.TaskLog, 7)
+    assert missing.is_missing(models.TaskLog, 8)
+
+
+def test_off(monkeypatch):
+    monkeypatch.setattr(missing, "missing_ids", TTLCache(100, 0))
+
+    missing.remember_missing(models.TaskLog, 7)
+
+    assert not missing.is_missing(models.TaskLog, 7)
+
+
+def test_replica_misses_are_kept_apart():
+    missing.remember_missing(models.TaskLog, 7, replica=True)
+
+    assert missing.is_missing(models.TaskLog, 7, replica=True)
+    # A client pinned to the primary doesn't trust a lagging replica
+    assert not missing.is_missing(models.TaskLog, 7, replica=False)
+
+    missing.forget_missing(models.TaskLog, 7)
+    assert not missing.is_missing(models.TaskLog, 7, replica=True)
+
+
+def test_pinned_requests_are_not_handed_replica_misses(
+    monkeypatch, seed, client
+):
+    seed(1, 1)
+    # Missed a moment ago on a replica that hadn't seen the rows yet
+    missing.remember_missing(models.TaskLog, 1, replica=True)
+    missing.remember_missing(models.Employee, 1, replica=True)
+    # A replica that can't be connected to
+    monkeypatch.setattr(database, "replicas", [None])
+    pinned = {PRIMARY_PIN_HEADER: str(time.time() + 60)}
+
+    assert client.get("/task-log/info/1", headers=pinned).status_code == 200
+    assert client.get("/employee/info/1", headers=pinned).status_code == 200
@@ -0,0 +1,104 @@
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import select
+
+from app import models
+from app.pagination import NEXT_CURSOR_HEADER, Page, decode_cursor, \
+    encode_cursor
+
+
+def page(after=None, limit=2) -> Page:
+    return Page(Response(), after=after, limit=limit)
+
+
+class Row:
+    def __init__(self, rating_id):
+        self.rating_id = rating_id
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([42, "a=b"])
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == [42, "a=b"]
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", encode_cursor(None)])
+def test_undecodable_cursor(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+
+    assert error.value.status_code == 400
+
+
+def test_filter_starts_after_the_cursor():
+    statement = page(after=encode_cursor([10])).filter(
+        select(models.Rating), models.Rating.rating_id
+    )
+    compiled = statement.compile()
+
+    assert "rating.rating_id > " in str(compiled)
+    assert "ORDER BY rating.rating_id" in str(compiled)
+    assert list(compiled.params.values()) == [10]
+
+
+def test_filter_without_cursor():
+    statement = page().filter(select(models.Rating), models.Rating.rating_id)
+
+    assert statement.whereclause is None
+
+
+@pytest.mark.parametrize("values", [
+    [], [1, 2], ["abc"], [1.5], [True], [None], [[1]]
+])
+def test_filter_rejects_cursor_not_matching_the_key(values):
+    with pytest.raises(HTTPException) as error:
+        page(after=encode_cursor(values)).filter(
+            select(models.Rating), models.Rating.rating_id
+        )
+
+    assert error.value.status_code == 400
+
+
+def test_take_sets_the_next_cursor():
+    current = page(limit=2)
+
+    results = current.take([Row(1), Row(2), Row(3)], models.Rating.rating_id)
+
+    assert [row.rating_id for row in results] == [1, 2]
+    assert decode_cursor(current.response.headers[NEXT_CURSOR_HEADER]) == [2]
+
+
+def test_take_of_the_last_page():
+    current = page(limit=2)
+
+    results = current.take([Row(1), Row(2)], models.Rating.rating_id)
+
+    assert len(results) == 2
+    assert NEXT_CURSOR_HEADER not in current.response.headers
+
+
+def test_window_walks_every_row_once():
+    rows = [Row(id) for id in range(1, 8)]
+    seen = []
+    after = None
+
+    while True:
+        current = page(after=after, limit=3)
+        window = current.window(rows, models.Rating.rating_id)
+        seen += current.take(window, models.Rating.rating_id)
+        after = current.response.headers.get(NEXT_CURSOR_HEADER)
+        if after is None:
+            break
+
+    assert [row.rating_id for row in seen] == list(range(1, 8))
+
+
+@pytest.mark.parametrize("values", [["abc"], [None], [1, 2]])
+def test_window_rejects_cursor_not_matching_the_key(values):
+    with pytest.raises(HTTPException) as error:
+        page(after=encode_cursor(values)).window(
+            [Row(1), Row(2)], models.Rating.rating_id
+        )
+
+    assert error.value.status_code == 400
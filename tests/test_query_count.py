@@ -0,0 +1,35 @@
+# The list endpoints load the nested objects of a page (creators,
+# initiatives, their types...) with a fixed number of queries, however
+# many rows the page has: no query per row.
+
+import pytest
+
+ENDPOINTS = ["/task-log/all", "/rating/all", "/initiative/all"]
+
+
+def count(client, queries, path) -> tuple:
+    """
+    The queries of a request for every row of `path`, and the rows
+    """
+    # Once first, for the reference tables to be cached
+    response = client.get(path, params={"limit": 1000})
+    assert response.status_code == 200
+
+    queries[0] = 0
+    response = client.get(path, params={"limit": 1000})
+    assert response.status_code == 200
+
+    return queries[0], len(response.json())
+
+
+@pytest.mark.parametrize("path", ENDPOINTS)
+def test_fixed_query_count(seed, client, queries, path):
+    seed(1, 10)
+    few, rows = count(client, queries, path)
+    assert rows == 10
+
+    seed(11, 190)
+    many, rows = count(client, queries, path)
+    assert rows == 200
+
+    assert few == many
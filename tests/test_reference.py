@@ -0,0 +1,54 @@
+from sqlalchemy import text
+
+from app import models, oauth2, reference
+from app.config import settings
+
+
+def ids(client, path, key) -> list:
+    response = client.get(path)
+    assert response.status_code == 200
+
+    return [row[key] for row in response.json()]
+
+
+def test_deleted_employee_type_takes_cascaded_rows_along(
+    monkeypatch, database, seed, client
+):
+    monkeypatch.setattr(settings, "response_cache_ttl_seconds", 60)
+    seed(1, 3)
+    # Employee 3, who created status code 3 and initiative type 3 (and
+    # through them initiative 3), gets a type of its own
+    with database.engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO employee_type (employee_type_id, role_name) "
+            "VALUES (2, 'guest')"
+        ))
+        connection.execute(text(
+            "UPDATE employee SET employee_type_id = 2 "
+            "WHERE employee_id = 3"
+        ))
+    for table in reference.tables.values():
+        table.invalidate()
+
+    assert ids(client, "/status-code/all", "status_id") == [1, 2, 3]
+    assert ids(
+        client, "/initiative-type/all", "initiative_type_id"
+    ) == [1, 2, 3]
+    assert ids(client, "/task-log/all/initiative/3", "task_id") == [3]
+
+    response = client.delete(
+        "/employee-type/delete/2",
+        headers={
+            "Authorization": "Bearer " + oauth2.create_access_token(
+                {"employee_id": 1}
+            )
+        }
+    )
+    assert response.status_code == 204
+
+    assert ids(client, "/status-code/all", "status_id") == [1, 2]
+    assert ids(
+        client, "/initiative-type/all", "initiative_type_id"
+    ) == [1, 2]
+    assert ids(client, "/task-log/all/initiative/3", "task_id") == []
+    assert 3 not in reference.tables[models.StatusCode]._by_key
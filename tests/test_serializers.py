@@ -0,0 +1,157 @@
+# The fast path of the JSON responses has to give the very same bytes as
+# FastAPI's own path (serialize_response, then JSONResponse), for every
+# schema of the app.
+
+import asyncio
+import inspect
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, List
+
+import pytest
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import BaseModel, EmailStr
+from pydantic.fields import SHAPE_DICT, SHAPE_LIST, SHAPE_SINGLETON
+
+from app import schemas, serializers
+from app.config import settings
+from app.serializers import Serializer, json_response
+
+SCHEMAS = [
+    schema for _, schema in inspect.getmembers(schemas, inspect.isclass)
+    if issubclass(schema, BaseModel) and schema.__module__ == schemas.__name__
+]
+
+VALUES = {
+    int: [7, 0, -12345678901],
+    str: ["plain", "ünïcödé \"quoted\" \\ </script>", ""],
+    bool: [True, False],
+    float: [1e-05, 0.1, 3.0, 1e20],
+    EmailStr: ["someone@example.com", "Some.One@EXAMPLE.Com"],
+    datetime: [
+        datetime(2022, 3, 4, 5, 6, 7, 890123, tzinfo=timezone.utc),
+        datetime(2022, 3, 4, 5, 6, 7),
+        datetime(2021, 12, 31, 23, 59, tzinfo=timezone(timedelta(hours=5,
+                                                                 minutes=30))),
+    ],
+    Any: [{"field": ["error", 1]}, "plain", None],
+}
+
+
+def sample(field, variant: int, none: bool):
+    """
+    A value for `field`, `variant` picks among the possible ones and
+    `none` leaves the optional fields unset
+    """
+    if field.allow_none and none:
+        return None
+
+    if field.shape == SHAPE_LIST:
+        return [
+            sample(field.sub_fields[0], variant + i, none)
+            for i in range(variant % 3)
+        ]
+
+    if field.shape == SHAPE_DICT:
+        return {
+            i: sample(field.sub_fields[0], variant + i, none)
+            for i in range(variant % 3)
+        }
+
+    assert field.shape == SHAPE_SINGLETON, field
+
+    if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+        return row(field.type_, variant, none)
+
+    values = VALUES[field.type_]
+    return values[variant % len(values)]
+
+
+def row(schema, variant: int, none: bool):
+    """
+    What an endpoint would return as `schema`: an ORM-like object for the
+    orm_mode schemas, else a dict
+    """
+    values = {
+        field.alias: sample(field, variant + i, none)
+        for i, field in enumerate(schema.__fields__.values())
+    }
+
+    if schema.__config__.orm_mode:
+        return SimpleNamespace(**values)
+    return values
+
+
+def fastapi_bytes(type_, content) -> bytes:
+    field = create_response_field(name="response", type_=type_)
+
+    return JSONResponse(
+        asyncio.run(serialize_response(field=field, response_content=content))
+    ).body
+
+
+CASES = [
+    pytest.param(schema, variant, none, id=f"{schema.__name__}-{variant}"
+                 f"{'-none' if none else ''}")
+    for schema in SCHEMAS
+    for variant in range(3)
+    for none in (False, True)
+]
+
+
+@pytest.mark.parametrize("schema, variant, none", CASES)
+def test_one(schema, variant, none):
+    content = row(schema, variant, none)
+    expected = fastapi_bytes(schema, content)
+
+    assert Serializer(schema).dumps(content) == expected
+    assert Serializer(schema).dumps_validated(content) == expected
+
+
+@pytest.mark.parametrize("schema, variant, none", CASES)
+def test_list(schema, variant, none):
+    content = [row(schema, variant + i, none) for i in range(3)]
+    expected = fastapi_bytes(List[schema], content)
+
+    assert Serializer(List[schema]).dumps(content) == expected
+    assert Serializer(List[schema]).dumps_validated(content) == expected
+
+
+@pytest.mark.parametrize("schema", SCHEMAS)
+def test_without_orjson(monkeypatch, schema):
+    monkeypatch.setattr(serializers, "orjson", None)
+    content = [row(schema, i, i % 2 == 1) for i in range(4)]
+
+    assert Serializer(List[schema]).dumps(content) == \
+        fastapi_bytes(List[schema], content)
+
+
+@pytest.mark.parametrize("fast", [False, True])
+@pytest.mark.parametrize("schema", SCHEMAS)
+def test_json_response(monkeypatch, fast, schema):
+    monkeypatch.setattr(settings, "fast_json_responses", fast)
+    content = [row(schema, i, i % 2 == 1) for i in range(4)]
+
+    response = json_response(List[schema], content)
+
+    assert response.body == fastapi_bytes(List[schema], content)
+    assert response.media_type == "application/json"
+
+
+def test_every_schema_is_covered():
+    assert schemas.RatingSummary in SCHEMAS
+    assert schemas.TaskLogComplete in SCHEMAS
+    assert len(SCHEMAS) > 40
+
+
+@pytest.mark.parametrize("schema", [
+    schema for schema in SCHEMAS if schema.__config__.orm_mode
+])
+def test_ndjson_line(schema):
+    for variant in range(3):
+        content = row(schema, variant, variant == 1)
+
+        assert Serializer(schema).line(content) == \
+            schema.from_orm(content).json()
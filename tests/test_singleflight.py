@@ -0,0 +1,154 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import Request
+
+from app import database
+from app.database import PRIMARY_PIN_HEADER
+from app.singleflight import Coalesced, SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(None)
+        await asyncio.sleep(0.01)
+        return [1, 2]
+
+    async def main():
+        return await asyncio.gather(
+            *[flights.do("key", compute) for _ in range(5)]
+        )
+
+    results = asyncio.run(main())
+
+    assert len(calls) == 1
+    assert results == [[1, 2]] * 5
+    assert flights.stats()["executions"] == 1
+    assert flights.stats()["coalesced"] == 4
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_other_keys_run_on_their_own():
+    flights = SingleFlight()
+
+    async def compute(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    async def main():
+        return await asyncio.gather(
+            flights.do("a", lambda: compute(1)),
+            flights.do("b", lambda: compute(2)),
+        )
+
+    assert asyncio.run(main()) == [1, 2]
+    assert flights.executions == 2
+
+
+def test_nothing_is_kept_afterwards():
+    flights = SingleFlight()
+    values = iter([1, 2])
+
+    async def compute():
+        return next(values)
+
+    async def main():
+        return [await flights.do("key", compute) for _ in range(2)]
+
+    assert asyncio.run(main()) == [1, 2]
+
+
+def test_waiting_calls_get_the_exception():
+    flights = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(
+            *[flights.do("key", compute) for _ in range(3)],
+            return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flights.executions == 1
+
+
+def test_a_waiting_call_takes_over_a_cancelled_one():
+    flights = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.create_task(flights.do("key", compute))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(flights.do("key", compute))
+        await asyncio.sleep(0.005)
+        first.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
+    assert flights.executions == 2
+    assert flights.coalesced == 0
+
+
+def request(query="", headers=()) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/task-log/all",
+        "query_string": query.encode(),
+        "headers": [
+            (name.lower().encode(), value.encode())
+            for name, value in headers
+        ],
+    })
+
+
+def coalesced_calls(*requests) -> int:
+    """
+    How many times the compute() of the identical steps of `requests`,
+    all in flight at once, ran
+    """
+    calls = []
+
+    async def compute():
+        calls.append(None)
+        await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*[
+            Coalesced(request).run("body", compute) for request in requests
+        ])
+
+    asyncio.run(main())
+    return len(calls)
+
+
+def test_same_query_in_another_order():
+    assert coalesced_calls(
+        request("limit=5&after=abc"), request("after=abc&limit=5")
+    ) == 1
+    assert coalesced_calls(request("limit=5"), request("limit=6")) == 2
+
+
+def test_pinned_requests_are_not_handed_replica_reads(monkeypatch):
+    monkeypatch.setattr(database, "replicas", [object()])
+    pinned = [(PRIMARY_PIN_HEADER, str(time.time() + 60))]
+
+    assert coalesced_calls(request(), request(headers=pinned)) == 2
+    assert coalesced_calls(
+        request(headers=pinned), request(headers=pinned)
+    ) == 1
@@ -0,0 +1,42 @@
+import json
+import time
+
+from app import database, streaming
+from app.database import PRIMARY_PIN_HEADER
+from app.streaming import NDJSON_MEDIA_TYPE
+
+
+def test_export(seed, client):
+    seed(1, 30)
+
+    response = client.get(
+        "/task-log/all", headers={"Accept": NDJSON_MEDIA_TYPE}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == NDJSON_MEDIA_TYPE
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["task_id"] for line in lines] == list(range(1, 31))
+
+
+def test_pinned_export_reads_from_the_primary(monkeypatch, seed, client):
+    seed(1, 3)
+    scopes = []
+    session_scope = streaming.session_scope
+
+    def recording_scope(replica=False):
+        scopes.append(replica)
+        return session_scope(replica)
+
+    monkeypatch.setattr(streaming, "session_scope", recording_scope)
+    # A replica that can't be connected to
+    monkeypatch.setattr(database, "replicas", [None])
+
+    response = client.get("/rating/all", headers={
+        "Accept": NDJSON_MEDIA_TYPE,
+        PRIMARY_PIN_HEADER: str(time.time() + 60),
+    })
+
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 3
+    assert scopes == [False]
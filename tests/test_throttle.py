@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+from fastapi import Request
+
+from app.config import settings
+from app.throttle import Limit, MemoryBuckets, client_address
+
+
+def request(*forwarded_for) -> Request:
+    return Request({
+        "type": "http",
+        "method": "POST",
+        "path": "/login",
+        "headers": [
+            (b"x-forwarded-for", value.encode()) for value in forwarded_for
+        ],
+        "client": ("10.0.0.1", 4000),
+    })
+
+
+def test_without_proxies_x_forwarded_for_is_ignored():
+    assert client_address(request("1.2.3.4")) == "10.0.0.1"
+
+
+@pytest.mark.parametrize("hops, forwarded_for, address", [
+    (1, ["1.2.3.4"], "1.2.3.4"),
+    # Whatever the client sent comes first
+    (1, ["6.6.6.6, 1.2.3.4"], "1.2.3.4"),
+    (1, ["6.6.6.6", "1.2.3.4"], "1.2.3.4"),
+    (2, ["6.6.6.6, 1.2.3.4, 10.0.0.2"], "1.2.3.4"),
+    # Not through the proxies
+    (2, ["1.2.3.4"], "10.0.0.1"),
+    (1, [], "10.0.0.1"),
+])
+def test_behind_proxies(monkeypatch, hops, forwarded_for, address):
+    monkeypatch.setattr(settings, "login_trusted_proxy_hops", hops)
+
+    assert client_address(request(*forwarded_for)) == address
+
+
+def test_buckets():
+    buckets = MemoryBuckets()
+    limits = {"a": Limit(2, 60), "b": Limit(5, 60)}
+
+    async def attempts():
+        return [await buckets.take(limits) for _ in range(3)]
+
+    first, second, third = asyncio.run(attempts())
+
+    assert first == second == 0
+    assert 0 < third <= 1
+    # Nothing taken from "b" by the attempt that was turned down
+    assert 3 <= buckets._buckets["b"][0] < 3.1
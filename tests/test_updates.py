@@ -0,0 +1,114 @@
+import pytest
+
+from app import oauth2
+from app.revocation import revocations
+
+
+@pytest.fixture
+def headers(client):
+    # Loaded, so that checking the token doesn't query the table
+    client.portal.call(revocations.rebuild)
+
+    return {
+        "Authorization": "Bearer " + oauth2.create_access_token(
+            {"employee_id": 2}
+        )
+    }
+
+
+@pytest.mark.parametrize("path, body, owner", [
+    ("/task-log", {"initiative_id": 2, "description": "new"}, "creator"),
+    ("/review", {"initiative_id": 2, "description": "new"}, "reviewer"),
+])
+def test_update_in_one_statement(seed, client, headers, queries,
+                                 path, body, owner):
+    seed(1, 2)
+    created = client.post(
+        f"{path}/create",
+        json={"initiative_id": 1, "description": "old"},
+        headers=headers
+    ).json()
+    id = created["task_id" if path == "/task-log" else "review_id"]
+
+    queries[0] = 0
+    response = client.put(f"{path}/update/{id}", json=body, headers=headers)
+
+    assert response.status_code == 200
+    assert queries[0] == 1
+    updated = response.json()
+    assert updated["description"] == "new"
+    assert updated["initiative"] == {
+        "initiative_id": 2, "title": "initiative 2"
+    }
+    assert updated[owner] == {"employee_id": 2, "employee_name": "employee 2"}
+    created_at = "logged_at" if path == "/task-log" else "given_at"
+    assert updated["updated_at"] >= updated[created_at]
+
+
+def test_initiative_update(seed, client, queries):
+    seed(1, 2)
+    client.portal.call(revocations.rebuild)
+    admin = {
+        "Authorization": "Bearer " + oauth2.create_access_token(
+            {"employee_id": 1}
+        )
+    }
+
+    body = {
+        "title": "renamed", "description": "-",
+        "initiative_type": 2, "status_id": 2
+    }
+    # Warms the principal and the reference caches
+    client.put("/initiative/update/2", json=body, headers=admin)
+
+    queries[0] = 0
+    response = client.put("/initiative/update/1", json=body, headers=admin)
+
+    assert response.status_code == 200
+    assert queries[0] == 1
+    updated = response.json()
+    assert updated["title"] == "renamed"
+    assert updated["init_type"]["initiative_type_id"] == 2
+    assert updated["init_type"]["name"] == "type 2"
+
+
+def test_update_of_someone_elses_row(seed, client, headers):
+    seed(1, 1)
+
+    response = client.put(
+        "/task-log/update/1",
+        json={"initiative_id": 1, "description": "new"},
+        headers=headers
+    )
+
+    assert response.status_code == 403
+    assert client.put(
+        "/task-log/update/99",
+        json={"initiative_id": 1, "description": "new"},
+        headers=headers
+    ).status_code == 404
+
+
+def test_rating_update_moves_the_summary(seed, client, headers):
+    seed(1, 2)
+    rating = client.post(
+        "/rating/create",
+        json={"initiative_id": 1, "point": 2},
+        headers=headers
+    ).json()
+
+    response = client.put(
+        f"/rating/update/{rating['rating_id']}",
+        json={"initiative_id": 2, "point": 4},
+        headers=headers
+    )
+
+    assert response.status_code == 200
+    assert response.json()["point"] == 4
+    assert response.json()["initiative"]["initiative_id"] == 2
+    assert response.json()["rater"]["employee_id"] == 2
+
+    summaries = client.get("/rating/summary", params={"ids": [1, 2]}).json()
+    assert [summary["rating_count"] for summary in summaries] == [0, 1]
+    assert summaries[1]["point_sum"] == 4
+    assert summaries[1]["histogram"] == {"4": 1}